@@ -2,10 +2,18 @@ import os
 import logging
 import asyncio
 import calendar as calendar_module
+import functools
+import heapq
+import weakref
+from collections import OrderedDict
 from datetime import date, datetime, time, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from operator import itemgetter
+from time import monotonic
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
+import aiohttp
 import httpx
+import orjson
 from maxapi import Bot, Dispatcher, F
 from maxapi.enums.attachment import AttachmentType
 from maxapi.enums.parse_mode import ParseMode
@@ -26,6 +34,7 @@ from app.renderer import (
     render_cart,
     render_goals_list,
     render_goal_detail,
+    STEP_STATUS_EMOJI,
 )
 from shared.utils.analytics import track_event, increment_user_counter, set_user_profile
 
@@ -43,6 +52,8 @@ CORE_SERVICE_URL = os.getenv("CORE_SERVICE_URL", "http://core:8004")
 LLM_SERVICE_URL = os.getenv("LLM_SERVICE_URL", "http://llm:8003")
 CONTEXT_SERVICE_URL = os.getenv("CONTEXT_SERVICE_URL", "http://context:8002")
 CALENDAR_SERVICE_URL = os.getenv("CALENDAR_SERVICE_URL")
+# Coalesce a user's rapid scheduling taps on one message into one orchestrator request (0 = off)
+CALLBACK_BATCH_WINDOW = int(os.getenv("CALLBACK_BATCH_WINDOW_MS", "0")) / 1000
 
 if not BOT_TOKEN:
     raise RuntimeError("MAX_BOT_TOKEN or TELEGRAM_BOT_TOKEN is required")
@@ -51,25 +62,175 @@ if not BOT_TOKEN:
 bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
 dp = Dispatcher()
 
-# HTTP client for Orchestrator and other services
-http_client = httpx.AsyncClient(timeout=30.0)
+# HTTP client for Orchestrator and other services.
+# Pool is sized for gather() fan-outs to the same few internal hosts; HTTP/1.1
+# keep-alive is what the internal uvicorn services speak (no h2c). The custom
+# transport retries a failed connect once (e.g. a service restarting); httpx
+# ignores client-level limits when a transport is given, so they live there.
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    transport=httpx.AsyncHTTPTransport(
+        retries=1,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60.0),
+    ),
+)
+# The calendar service syncs external ICS feeds and can be slow; it gets its own
+# small pool so those calls never hold connections the Core/orchestrator path needs
+calendar_client: Optional[httpx.AsyncClient] = (
+    httpx.AsyncClient(
+        base_url=CALENDAR_SERVICE_URL,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+    )
+    if CALENDAR_SERVICE_URL
+    else None
+)
+# Keep-alive connections to the orchestrator opened at startup, so the first
+# burst of messages doesn't pay for connection setup
+ORCHESTRATOR_WARM_CONNECTIONS = 4
+# Outbound MAX API connections (replies, edits, typing) share one pool
+BOT_CONNECTION_LIMIT = 200
 
 # User states for multi-step interactions
 user_states: Dict[str, Dict[str, Any]] = {}
 
-WEEKDAY_NAMES = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-MONTH_NAMES = [
+# Per-user locks; entries disappear once no handler holds a reference
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Strong refs to fire-and-forget tasks so they aren't garbage collected mid-flight
+_bg_tasks: Set[asyncio.Task] = set()
+
+# Analytics calls are blocking network I/O; a single worker drains them off the
+# request path in arrival order, up to ANALYTICS_BATCH_SIZE per thread hop
+ANALYTICS_QUEUE_SIZE = 10_000
+ANALYTICS_BATCH_SIZE = 64
+_analytics_queue: "asyncio.Queue[Tuple[Any, tuple]]" = asyncio.Queue(maxsize=ANALYTICS_QUEUE_SIZE)
+_analytics_worker_task: Optional[asyncio.Task] = None
+
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+MONTH_NAMES = (
     "января", "февраля", "марта", "апреля", "мая", "июня",
     "июля", "августа", "сентября", "октября", "ноября", "декабря"
-]
+)
 MAX_LEADERBOARD_USERS = 10
+# Concurrent per-user goal fetches while building the leaderboard
+LEADERBOARD_FANOUT_LIMIT = 8
+
+# Voice downloads past this size are cut off mid-stream so a single oversized
+# upload can't eat bandwidth and transcription quota
+MAX_VOICE_BYTES = 20 * 1024 * 1024
+VOICE_TOO_LONG_TEXT = "😔 Голосовое сообщение слишком длинное. Попробуй записать покороче."
+
+# Short-lived LRU goal cache: goal views are re-fetched on every click
+GOAL_CACHE_TTL = 10.0
+GOAL_CACHE_MAX_SIZE = 1024
+_goal_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+# Goal GETs currently on the wire, so concurrent misses for one key share a request
+_goal_inflight: Dict[Tuple[str, str], "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+
+# Read-only orchestrator tables keyed by (user_id, normalized message), so a
+# repeated "покажи цели" within a few seconds skips the orchestrator round trip
+REPLY_CACHE_TTL = 5.0
+REPLY_CACHE_MAX_SIZE = 1024
+_reply_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+# Rendered stats/calendar views keyed by (user_id, view); users flip between
+# week and month or re-open stats within seconds
+VIEW_CACHE_TTL = 20.0
+VIEW_CACHE_MAX_SIZE = 1024
+_view_cache: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+
+# "Today" only needs minute-level freshness for dashboards and calendar ranges
+TODAY_CACHE_TTL = 60.0
+_today_cache: Tuple[float, Optional[date]] = (0.0, None)
+
+# Static keyboard rows shared across renders; build_inline_keyboard copies rows
+# and maxapi only serializes buttons, so reusing the instances is safe
+GOALS_LIST_FOOTER_ROW = (
+    CallbackButton(text="➕ Новая цель", payload="new_goal"),
+    CallbackButton(text="🏠 Меню", payload="main_menu"),
+)
+GOAL_DETAIL_NAV_ROW = (
+    CallbackButton(text="◀️ К списку целей", payload="show_goals"),
+    CallbackButton(text="🏠 Меню", payload="main_menu"),
+)
+MAIN_MENU_ROW = (CallbackButton(text="🏠 Главное меню", payload="main_menu"),)
 
 # --- Helper builders ---
 
+def _on_background_done(task: asyncio.Task):
+    _bg_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task failed: %s", task.exception())
+
+
+def _spawn_background(coro: Awaitable) -> asyncio.Task:
+    """Run a coroutine without blocking the reply; failures are only logged."""
+    task = asyncio.ensure_future(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+
+def _track(func, *args):
+    """Queue an analytics call for the background worker; evicts the oldest when full."""
+    if _analytics_queue.full():
+        dropped, _ = _analytics_queue.get_nowait()
+        _analytics_queue.task_done()
+        logger.warning("Analytics queue full, dropping %s", getattr(dropped, "__name__", dropped))
+    _analytics_queue.put_nowait((func, args))
+
+
+def _run_analytics_batch(batch: List[Tuple[Any, tuple]]):
+    for func, args in batch:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error("Analytics call failed: %s", e)
+
+
+async def _analytics_worker():
+    while True:
+        batch = [await _analytics_queue.get()]
+        # Whatever queued up meanwhile goes out in the same thread hop
+        while len(batch) < ANALYTICS_BATCH_SIZE and not _analytics_queue.empty():
+            batch.append(_analytics_queue.get_nowait())
+        try:
+            await asyncio.to_thread(_run_analytics_batch, batch)
+        finally:
+            for _ in batch:
+                _analytics_queue.task_done()
+
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# Bytes of an error response body kept in log lines
+LOG_BODY_PREVIEW = 500
+
+
+def _body_preview(response: httpx.Response) -> str:
+    """Bounded slice of a response body for logs; outage pages can be huge."""
+    return response.content[:LOG_BODY_PREVIEW].decode("utf-8", errors="replace")
+
+
+def _json_body(payload: Any) -> Dict[str, Any]:
+    """httpx request kwargs for a JSON body encoded with orjson."""
+    return {"content": orjson.dumps(payload), "headers": _JSON_HEADERS}
+
+
+def _user_lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+
 def _attachments(markup):
     return [markup] if markup else None
 
 
+# Constant keyboards are built once and shared; maxapi only serializes them
+@functools.lru_cache(maxsize=None)
 def main_menu_keyboard():
     return keyboard_from_pairs([
         [("🎯 Мои цели", "show_goals"), ("📅 Календарь", "calendar_view_week")],
@@ -78,22 +239,90 @@ def main_menu_keyboard():
     ])
 
 
+@functools.lru_cache(maxsize=32)
 def single_menu_button(text: str, payload: str):
     return keyboard_from_pairs([[(text, payload)]])
 
 
+@functools.lru_cache(maxsize=None)
+def events_table_keyboard():
+    return keyboard_from_pairs([[("➕ Новое событие", "new_event"), ("🏠 Меню", "main_menu")]])
+
+
+@functools.lru_cache(maxsize=None)
+def goals_table_keyboard():
+    return build_inline_keyboard([GOALS_LIST_FOOTER_ROW])
+
+
+@functools.lru_cache(maxsize=None)
+def events_list_keyboard():
+    return keyboard_from_pairs([
+        [("➕ Новое событие", "new_event"), ("🏠 Меню", "main_menu")],
+        [("📅 Календарь", "calendar_view_week")],
+    ])
+
+
+@functools.lru_cache(maxsize=None)
+def events_empty_keyboard():
+    return keyboard_from_pairs([
+        [("➕ Создать событие", "new_event")],
+        [("📅 Календарь", "calendar_view_week")],
+        [("🏠 Меню", "main_menu")],
+    ])
+
+
+@functools.lru_cache(maxsize=None)
+def events_menu_keyboard():
+    return keyboard_from_pairs([[("📅 События", "show_events"), ("🏠 Меню", "main_menu")]])
+
+
+@functools.lru_cache(maxsize=None)
+def stats_footer_keyboard():
+    return keyboard_from_pairs([
+        [("🎯 Цели", "show_goals"), ("🏠 Меню", "main_menu")],
+        [("🏆 Лидерборд", "leaderboard")],
+    ])
+
+
+@functools.lru_cache(maxsize=None)
+def leaderboard_footer_keyboard():
+    return keyboard_from_pairs([[("📊 Статистика", "show_stats"), ("🏠 Меню", "main_menu")]])
+
+
+# Orchestrator table item_kind -> (renderer, keyboard builder, default title)
+TABLE_RENDERERS = {
+    "event": (render_events, events_table_keyboard, "События"),
+    "goal": (render_goals, goals_table_keyboard, "Цели"),
+    "product": (render_products, None, "Товары"),
+    "cart": (render_cart, None, "Корзина"),
+}
+
+
+def _guess_item_kind(item: Dict[str, Any]) -> Optional[str]:
+    """Infer the table item kind from its fields when the orchestrator didn't send one."""
+    if item.get("date"):
+        return "event"
+    if item.get("steps"):
+        return "goal"
+    if item.get("price"):
+        return "product"
+    if item.get("product"):
+        return "cart"
+    return None
+
+
 async def fetch_calendar_link(user_id: str) -> Optional[str]:
-    if not CALENDAR_SERVICE_URL:
+    if calendar_client is None:
         return None
     try:
-        response = await http_client.post(
-            f"{CALENDAR_SERVICE_URL}/api/calendars/users/{user_id}/calendar",
-            json={},
+        response = await calendar_client.post(
+            f"/api/calendars/users/{user_id}/calendar",
+            **_json_body({}),
         )
         if response.status_code >= 400:
-            logger.warning("Failed to fetch calendar link for %s: %s", user_id, response.text)
+            logger.warning("Failed to fetch calendar link for %s: %s", user_id, _body_preview(response))
             return None
-        data = response.json()
+        data = orjson.loads(response.content)
         return data.get("public_ics_url")
     except Exception as exc:
         logger.error("Calendar link request failed for %s: %s", user_id, exc)
@@ -110,8 +339,8 @@ async def fetch_goals_for_user_raw(user_id: str, status: Optional[str] = None) -
             params=params
         )
         if response.status_code == 200:
-            return response.json()
-        logger.warning("Failed to load goals for %s: %s", user_id, response.text)
+            return orjson.loads(response.content)
+        logger.warning("Failed to load goals for %s: %s", user_id, _body_preview(response))
     except Exception as exc:
         logger.error("Goal request failed for %s: %s", user_id, exc)
     return []
@@ -128,24 +357,171 @@ async def fetch_events_range(user_id: str, start: date, end: date) -> List[Dict[
             }
         )
         if response.status_code == 200:
-            return response.json()
-        logger.warning("Failed to load events for %s: %s", user_id, response.text)
+            return orjson.loads(response.content)
+        logger.warning("Failed to load events for %s: %s", user_id, _body_preview(response))
     except Exception as exc:
         logger.error("Event request failed for %s: %s", user_id, exc)
     return []
 
 
+def _today() -> date:
+    """Current local date, re-read from the clock at most once a minute."""
+    global _today_cache
+    expires_at, today = _today_cache
+    now = monotonic()
+    if today is None or now >= expires_at:
+        today = date.today()
+        _today_cache = (now + TODAY_CACHE_TTL, today)
+    return today
+
+
+async def fetch_goal(user_id: str, goal_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch a single goal, served from a short TTL cache when fresh; concurrent misses share one GET."""
+    key = (user_id, str(goal_id))
+    cached = _goal_cache.get(key)
+    if cached:
+        if cached[0] > monotonic():
+            _goal_cache.move_to_end(key)
+            return cached[1]
+        del _goal_cache[key]
+
+    task = _goal_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_goal(user_id, goal_id, key))
+        _goal_inflight[key] = task
+        task.add_done_callback(lambda done: _forget_inflight_goal(key, done))
+    # Shielded so one cancelled waiter doesn't cancel the request for the others
+    return await asyncio.shield(task)
+
+
+async def _load_goal(user_id: str, goal_id: str, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    response = await http_client.get(
+        f"{CORE_SERVICE_URL}/api/goals/{goal_id}",
+        params={"user_id": user_id}
+    )
+    if response.status_code != 200:
+        _goal_cache.pop(key, None)
+        return None
+
+    goal = orjson.loads(response.content)
+    # An invalidation while the GET was in flight unregisters this task; don't cache stale data
+    if _goal_inflight.get(key) is asyncio.current_task():
+        cache_goal(user_id, goal)
+    return goal
+
+
+def _forget_inflight_goal(key: Tuple[str, str], task: asyncio.Task):
+    if _goal_inflight.get(key) is task:
+        del _goal_inflight[key]
+    # Waiters await through shield; if they were all cancelled nobody else reads the error
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Goal fetch %s failed: %s", key, task.exception())
+
+
+def cache_goal(user_id: str, goal: Dict[str, Any]):
+    """Store an already-fetched goal (with steps) in the goal cache."""
+    goal_id = goal.get("id")
+    if goal_id is None:
+        return
+    key = (user_id, str(goal_id))
+    _goal_cache[key] = (monotonic() + GOAL_CACHE_TTL, goal)
+    _goal_cache.move_to_end(key)
+    while len(_goal_cache) > GOAL_CACHE_MAX_SIZE:
+        _goal_cache.popitem(last=False)
+
+
+def invalidate_goal_cache(user_id: str, goal_id: Optional[str] = None):
+    """Drop cached goals after a mutation (all of the user's goals if no id given)."""
+    invalidate_reply_cache(user_id)
+    invalidate_view_cache(user_id)
+    if goal_id is not None:
+        _goal_cache.pop((user_id, str(goal_id)), None)
+        _goal_inflight.pop((user_id, str(goal_id)), None)
+        return
+    for key in [k for k in _goal_cache if k[0] == user_id]:
+        del _goal_cache[key]
+    for key in [k for k in _goal_inflight if k[0] == user_id]:
+        del _goal_inflight[key]
+
+
+def _reply_cache_key(user_id: str, message: str) -> Tuple[str, str]:
+    return user_id, " ".join(message.lower().split())
+
+
+def get_cached_reply(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """Return a still-fresh orchestrator reply for this message, if any."""
+    cached = _reply_cache.get(key)
+    if not cached:
+        return None
+    if cached[0] <= monotonic():
+        del _reply_cache[key]
+        return None
+    _reply_cache.move_to_end(key)
+    return cached[1]
+
+
+def cache_reply(key: Tuple[str, str], result: Dict[str, Any]):
+    _reply_cache[key] = (monotonic() + REPLY_CACHE_TTL, result)
+    _reply_cache.move_to_end(key)
+    while len(_reply_cache) > REPLY_CACHE_MAX_SIZE:
+        _reply_cache.popitem(last=False)
+
+
+async def _record_cached_turn(user_id: str, message: str, reply_text: Optional[str]):
+    """Append a cache-served turn to the conversation history, as the orchestrator would."""
+    url = f"{CONTEXT_SERVICE_URL}/api/conversation/{user_id}/messages"
+    turns = [("user", message)]
+    if reply_text:
+        turns.append(("assistant", reply_text))
+    for role, content in turns:
+        response = await http_client.post(url, **_json_body({"role": role, "content": content}))
+        if response.status_code >= 400:
+            logger.warning("[%s] Failed to record cached turn: %s", user_id, response.status_code)
+            return
+
+
+def invalidate_reply_cache(user_id: str):
+    """Drop the user's cached orchestrator replies; any mutation may stale them."""
+    for key in [k for k in _reply_cache if k[0] == user_id]:
+        del _reply_cache[key]
+
+
+async def _cached_view(user_id: str, view: str, build: Callable[[], Awaitable[str]]) -> str:
+    """Serve a rendered view from the short TTL cache, building it on a miss."""
+    key = (user_id, view)
+    cached = _view_cache.get(key)
+    if cached:
+        if cached[0] > monotonic():
+            _view_cache.move_to_end(key)
+            return cached[1]
+        del _view_cache[key]
+
+    text = await build()
+    _view_cache[key] = (monotonic() + VIEW_CACHE_TTL, text)
+    while len(_view_cache) > VIEW_CACHE_MAX_SIZE:
+        _view_cache.popitem(last=False)
+    return text
+
+
+def invalidate_view_cache(user_id: str):
+    for key in [k for k in _view_cache if k[0] == user_id]:
+        del _view_cache[key]
+
+
 def _safe_date(value: Optional[str]) -> Optional[date]:
     if not value:
         return None
     try:
+        # Plain dates skip the intermediate datetime; full timestamps still parse
+        if len(value) == 10:
+            return date.fromisoformat(value)
         return datetime.fromisoformat(value).date()
     except ValueError:
         return None
 
 
 def _format_weekday(d: date) -> str:
-    return f"{WEEKDAY_NAMES[d.weekday()]} {d.strftime('%d.%m')}"
+    return f"{WEEKDAY_NAMES[d.weekday()]} {d.day:02d}.{d.month:02d}"
 
 
 def _event_datetime(event: Dict[str, Any]) -> Optional[datetime]:
@@ -156,7 +532,11 @@ def _event_datetime(event: Dict[str, Any]) -> Optional[datetime]:
     event_time_obj: Optional[time] = None
     if event_time_str:
         try:
-            event_time_obj = datetime.strptime(event_time_str, "%H:%M").time()
+            # "HH:MM" is the common case; slicing avoids strptime's regex/locale work
+            if len(event_time_str) == 5 and event_time_str[2] == ":" and event_time_str[:2].isdigit():
+                event_time_obj = time(int(event_time_str[:2]), int(event_time_str[3:]))
+            else:
+                event_time_obj = datetime.strptime(event_time_str, "%H:%M").time()
         except ValueError:
             event_time_obj = None
     return datetime.combine(event_date, event_time_obj or time.min)
@@ -166,13 +546,21 @@ def _format_period(start: date, end: date) -> str:
     if start.month == end.month:
         month_name = MONTH_NAMES[start.month - 1]
         return f"{start.day}–{end.day} {month_name}"
-    return f"{start.strftime('%d.%m')} – {end.strftime('%d.%m')}"
+    return f"{start.day:02d}.{start.month:02d} – {end.day:02d}.{end.month:02d}"
 
 
 async def build_personal_stats(user_id: str) -> str:
-    goals = await fetch_goals_for_user_raw(user_id)
-    today = date.today()
+    return await _cached_view(user_id, "stats", lambda: _render_personal_stats(user_id))
+
+
+async def _render_personal_stats(user_id: str) -> str:
+    today = _today()
     week_start = today - timedelta(days=7)
+    # Both fetchers swallow their own errors, so they can simply run side by side
+    goals, events_next_week = await asyncio.gather(
+        fetch_goals_for_user_raw(user_id),
+        fetch_events_range(user_id, today, today + timedelta(days=7)),
+    )
 
     if not goals:
         return (
@@ -182,39 +570,39 @@ async def build_personal_stats(user_id: str) -> str:
         )
 
     total_goals = len(goals)
-    active_goals = sum(1 for goal in goals if goal.get("status") == "active")
-    completed_goals = sum(1 for goal in goals if goal.get("status") == "completed")
-    avg_progress = sum(goal.get("progress_percent", 0) for goal in goals) / max(total_goals, 1)
-
-    total_steps = sum(len(goal.get("steps", [])) for goal in goals)
-    completed_steps = sum(
-        1 for goal in goals for step_item in goal.get("steps", [])
-        if step_item.get("status") == "completed"
-    )
-    steps_last_week = 0
+    active_goals = completed_goals = 0
+    progress_sum = 0
+    total_steps = completed_steps = steps_last_week = 0
+    next_deadline: Optional[date] = None
+    # One pass over goals and their steps collects every counter
     for goal in goals:
-        for step_item in goal.get("steps", []):
+        status = goal.get("status")
+        if status == "active":
+            active_goals += 1
+        elif status == "completed":
+            completed_goals += 1
+        progress_sum += goal.get("progress_percent", 0)
+
+        deadline = _safe_date(goal.get("target_date"))
+        if deadline and (next_deadline is None or deadline < next_deadline):
+            next_deadline = deadline
+
+        steps = goal.get("steps", [])
+        total_steps += len(steps)
+        for step_item in steps:
             if step_item.get("status") != "completed":
                 continue
+            completed_steps += 1
             completed_at = _safe_date(step_item.get("completed_at"))
             if completed_at and completed_at >= week_start:
                 steps_last_week += 1
 
-    next_deadline = min(
-        (parsed for parsed in (_safe_date(goal.get("target_date")) for goal in goals) if parsed),
-        default=None
-    )
+    avg_progress = progress_sum / max(total_goals, 1)
 
-    events_next_week = await fetch_events_range(user_id, today, today + timedelta(days=7))
     upcoming_events = len(events_next_week)
-    next_event = None
-    if events_next_week:
-        events_sorted = sorted(
-            (evt for evt in events_next_week if _event_datetime(evt)),
-            key=lambda evt: _event_datetime(evt)
-        )
-        if events_sorted:
-            next_event = events_sorted[0]
+    # Parse each event's date/time once, then take the earliest
+    timed_events = [(dt, evt) for evt in events_next_week if (dt := _event_datetime(evt))]
+    next_event = min(timed_events, key=itemgetter(0))[1] if timed_events else None
 
     lines = [
         "📊 <b>Личная статистика</b>",
@@ -242,12 +630,9 @@ async def build_personal_stats(user_id: str) -> str:
 
 
 async def show_personal_stats(chat_id: Optional[int], user_id: str, bot_instance: Bot):
-    await send_typing(bot_instance, chat_id)
+    _spawn_background(send_typing(bot_instance, chat_id))
     stats_text = await build_personal_stats(user_id)
-    keyboard = keyboard_from_pairs([
-        [("🎯 Цели", "show_goals"), ("🏠 Меню", "main_menu")],
-        [("🏆 Лидерборд", "leaderboard")],
-    ])
+    keyboard = stats_footer_keyboard()
     await bot_instance.send_message(
         chat_id=chat_id,
         text=stats_text,
@@ -269,27 +654,63 @@ async def _user_goals_summary(user_id: str) -> Dict[str, Any]:
     }
 
 
-async def build_leaderboard(user_id: str) -> str:
+async def _leaderboard_summaries(user_id: str) -> List[Dict[str, Any]]:
+    """Goal summaries for the leaderboard, aggregated by Core in one request."""
+    try:
+        response = await http_client.get(
+            f"{CORE_SERVICE_URL}/api/leaderboard/goals",
+            params={"me": user_id, "limit": MAX_LEADERBOARD_USERS}
+        )
+    except Exception as exc:
+        logger.error("Goals leaderboard request failed: %s", exc)
+        return []
+
+    if response.status_code == 200:
+        return orjson.loads(response.content)
+    if response.status_code == 404:
+        # Core predates the aggregate endpoint; fall back to one goals GET per user
+        logger.warning("Goals leaderboard endpoint missing, summarizing per user")
+        return await _leaderboard_summaries_per_user(user_id)
+    # A failing Core would fail the per-user fan-out too; don't pile more requests on it
+    logger.error("Goals leaderboard error: %s %s", response.status_code, _body_preview(response))
+    return []
+
+
+async def _leaderboard_summaries_per_user(user_id: str) -> List[Dict[str, Any]]:
+    # The caller is always ranked, so their goals needn't wait for the user list
+    own_summary = asyncio.create_task(_user_goals_summary(user_id))
+
     user_ids: List[str] = []
     try:
         response = await http_client.get(f"{CORE_SERVICE_URL}/api/users")
         if response.status_code == 200:
             user_ids = [
                 u.get("user_id")
-                for u in response.json()
+                for u in orjson.loads(response.content)
                 if u.get("user_id")
             ]
         else:
-            logger.warning("Failed to fetch users for leaderboard: %s", response.text)
+            logger.warning("Failed to fetch users for leaderboard: %s", _body_preview(response))
     except Exception as exc:
         logger.error("User list request failed: %s", exc)
 
-    if user_id not in user_ids:
-        user_ids.insert(0, user_id)
+    other_ids = [uid for uid in user_ids if uid != user_id][:MAX_LEADERBOARD_USERS - 1]
+
+    fanout = asyncio.Semaphore(LEADERBOARD_FANOUT_LIMIT)
+
+    async def bounded_summary(uid: str) -> Dict[str, Any]:
+        async with fanout:
+            return await _user_goals_summary(uid)
+
+    return await asyncio.gather(own_summary, *(bounded_summary(uid) for uid in other_ids))
 
-    user_ids = user_ids[:MAX_LEADERBOARD_USERS]
 
-    summaries = await asyncio.gather(*[_user_goals_summary(uid) for uid in user_ids])
+def _leaderboard_label(entry_user_id: str, user_id: str) -> str:
+    return "⭐️ Ты" if entry_user_id == user_id else f"ID {entry_user_id}"
+
+
+async def build_leaderboard(user_id: str) -> str:
+    summaries = await _leaderboard_summaries(user_id)
     entries = [summary for summary in summaries if summary]
 
     if not entries:
@@ -305,29 +726,22 @@ async def build_leaderboard(user_id: str) -> str:
         reverse=True
     )
 
-    lines = [
-        "🏆 <b>Лидерборд</b>",
-        "Лучшие по среднему прогрессу целей:",
-    ]
-
     display_entries = entries_sorted[:5]
-    for idx, entry in enumerate(display_entries, start=1):
-        marker = "⭐️ " if entry["user_id"] == user_id else ""
-        label = "Ты" if entry["user_id"] == user_id else f"ID {entry['user_id']}"
-        lines.append(
-            f"{idx}. {marker}{label} — <b>{entry['avg_progress']:.0f}%</b> "
-            f"(закрыто целей: {entry['completed']}/{entry['total']})"
-        )
+    lines = ["🏆 <b>Лидерборд</b>\nЛучшие по среднему прогрессу целей:"]
+    lines.extend(
+        f"{idx}. {_leaderboard_label(entry['user_id'], user_id)} — <b>{entry['avg_progress']:.0f}%</b> "
+        f"(закрыто целей: {entry['completed']}/{entry['total']})"
+        for idx, entry in enumerate(display_entries, start=1)
+    )
 
-    current_rank = next(
-        (idx for idx, entry in enumerate(entries_sorted, start=1) if entry["user_id"] == user_id),
-        None
+    # Rank and entry in one scan instead of two next() lookups
+    current_rank, own_entry = next(
+        ((idx, entry) for idx, entry in enumerate(entries_sorted, start=1) if entry["user_id"] == user_id),
+        (None, None)
     )
     if current_rank and current_rank > len(display_entries):
-        own_entry = next(entry for entry in entries_sorted if entry["user_id"] == user_id)
-        lines.append("")
         lines.append(
-            f"Ты на {current_rank}-м месте с прогрессом {own_entry['avg_progress']:.0f}% "
+            f"\nТы на {current_rank}-м месте с прогрессом {own_entry['avg_progress']:.0f}% "
             f"({own_entry['completed']} завершённых целей)."
         )
 
@@ -335,11 +749,9 @@ async def build_leaderboard(user_id: str) -> str:
 
 
 async def show_leaderboard(chat_id: Optional[int], user_id: str, bot_instance: Bot):
-    await send_typing(bot_instance, chat_id)
+    _spawn_background(send_typing(bot_instance, chat_id))
     text = await build_leaderboard(user_id)
-    keyboard = keyboard_from_pairs([
-        [("📊 Статистика", "show_stats"), ("🏠 Меню", "main_menu")],
-    ])
+    keyboard = leaderboard_footer_keyboard()
     await bot_instance.send_message(
         chat_id=chat_id,
         text=text,
@@ -349,7 +761,7 @@ async def show_leaderboard(chat_id: Optional[int], user_id: str, bot_instance: B
 
 
 def _calendar_period(period: str) -> Tuple[date, date]:
-    today = date.today()
+    today = _today()
     if period == "today":
         return today, today
     if period == "month":
@@ -359,7 +771,9 @@ def _calendar_period(period: str) -> Tuple[date, date]:
     return today, today + timedelta(days=6)
 
 
+@functools.lru_cache(maxsize=8)
 def calendar_view_keyboard(active: str):
+    # Pure function of the active tab; maxapi only reads attachments when sending
     labels = [
         ("calendar_view_today", "Сегодня"),
         ("calendar_view_week", "Неделя"),
@@ -391,7 +805,8 @@ def _render_day_block(day: date, events: List[Dict[str, Any]]) -> List[str]:
         lines.append("  <i>Нет событий</i>")
         return lines
 
-    for event in sorted(events, key=lambda e: (e.get("time") or "24:00", e.get("title", "")))[:4]:
+    # Only four are shown, so a bounded heap beats sorting the whole day
+    for event in heapq.nsmallest(4, events, key=lambda e: (e.get("time") or "24:00", e.get("title", ""))):
         time_hint = event.get("time") or "весь день"
         title = event.get("title", "Событие")
         lines.append(f"  • {time_hint} — {title}")
@@ -401,6 +816,12 @@ def _render_day_block(day: date, events: List[Dict[str, Any]]) -> List[str]:
 
 
 async def build_calendar_overview(user_id: str, period: str) -> str:
+    return await _cached_view(
+        user_id, f"calendar_{period}", lambda: _render_calendar_overview(user_id, period)
+    )
+
+
+async def _render_calendar_overview(user_id: str, period: str) -> str:
     start, end = _calendar_period(period)
     events = await fetch_events_range(user_id, start, end)
 
@@ -417,19 +838,10 @@ async def build_calendar_overview(user_id: str, period: str) -> str:
         "",
     ]
 
-    grouped: Dict[str, List[Dict[str, Any]]] = {}
-    for event in events:
-        event_date = _safe_date(event.get("date"))
-        if not event_date:
-            continue
-        grouped.setdefault(event_date.isoformat(), []).append(event)
-
     if period == "month":
         lines.append(f"Всего событий в этом месяце: <b>{len(events)}</b>")
-        upcoming = sorted(
-            (evt for evt in events if _event_datetime(evt)),
-            key=_event_datetime
-        )[:5]
+        timed_events = [(dt, evt) for evt in events if (dt := _event_datetime(evt))]
+        upcoming = [evt for _, evt in heapq.nsmallest(5, timed_events, key=itemgetter(0))]
         if upcoming:
             lines.append("")
             lines.append("<b>Ближайшие события:</b>")
@@ -444,17 +856,26 @@ async def build_calendar_overview(user_id: str, period: str) -> str:
             lines.append("<i>В этом месяце пока нет событий.</i>")
         return "\n".join(lines)
 
-    current = start
-    while current <= end:
-        lines.extend(_render_day_block(current, grouped.get(current.isoformat(), [])))
+    # Bucket events by day offset from the period start; out-of-range dates are dropped
+    span = (end - start).days + 1
+    buckets: List[List[Dict[str, Any]]] = [[] for _ in range(span)]
+    for event in events:
+        event_date = _safe_date(event.get("date"))
+        if not event_date:
+            continue
+        offset = (event_date - start).days
+        if 0 <= offset < span:
+            buckets[offset].append(event)
+
+    for offset, day_events in enumerate(buckets):
+        lines.extend(_render_day_block(start + timedelta(days=offset), day_events))
         lines.append("")
-        current += timedelta(days=1)
 
     return "\n".join(lines).strip()
 
 
 async def show_calendar_overview(chat_id: Optional[int], user_id: str, bot_instance: Bot, period: str):
-    await send_typing(bot_instance, chat_id)
+    _spawn_background(send_typing(bot_instance, chat_id))
     text = await build_calendar_overview(user_id, period)
     keyboard = calendar_view_keyboard(period)
     await bot_instance.send_message(
@@ -469,27 +890,35 @@ async def show_calendar_overview(chat_id: Optional[int], user_id: str, bot_insta
 async def get_dashboard_stats(user_id: str) -> str:
     """Get user dashboard with upcoming events and goals progress"""
     try:
-        from datetime import datetime, timedelta
-        import random
-
-        stats_lines: List[str] = []
+        sections: List[str] = []
 
-        today = datetime.now().date()
+        today = _today()
         three_days = today + timedelta(days=3)
 
-        events_response = await http_client.get(
-            f"{CORE_SERVICE_URL}/api/events",
-            params={
-                "user_id": user_id,
-                "start_date": today.isoformat(),
-                "end_date": three_days.isoformat()
-            }
+        # Events and goals are independent; fetch them concurrently and
+        # render whichever section succeeded
+        events_response, goals_response = await asyncio.gather(
+            http_client.get(
+                f"{CORE_SERVICE_URL}/api/events",
+                params={
+                    "user_id": user_id,
+                    "start_date": today.isoformat(),
+                    "end_date": three_days.isoformat()
+                }
+            ),
+            http_client.get(
+                f"{CORE_SERVICE_URL}/api/goals",
+                params={"user_id": user_id, "status": "active"}
+            ),
+            return_exceptions=True,
         )
 
-        if events_response.status_code == 200:
-            events = events_response.json()
+        if isinstance(events_response, Exception):
+            logger.error("Dashboard events request failed: %s", events_response)
+        elif events_response.status_code == 200:
+            events = orjson.loads(events_response.content)
             if events:
-                stats_lines.append("📅 <b>Ближайшие события:</b>")
+                event_lines = ["📅 <b>Ближайшие события:</b>"]
                 for event in events[:3]:
                     title = event.get("title", "Событие")
                     date = event.get("date", "")
@@ -497,32 +926,32 @@ async def get_dashboard_stats(user_id: str) -> str:
 
                     try:
                         date_obj = datetime.fromisoformat(date)
-                        weekday = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date_obj.weekday()]
-                        date_str = f"{weekday}, {date_obj.strftime('%d.%m')}"
-                    except Exception:
+                        date_str = (
+                            f"{WEEKDAY_NAMES[date_obj.weekday()]}, "
+                            f"{date_obj.day:02d}.{date_obj.month:02d}"
+                        )
+                    except (TypeError, ValueError):
                         date_str = date
 
                     time_str = f" в {time}" if time else ""
-                    stats_lines.append(f"  • {title} — {date_str}{time_str}")
-                stats_lines.append("")
+                    event_lines.append(f"  • {title} — {date_str}{time_str}")
+                sections.append("\n".join(event_lines))
 
-        goals_response = await http_client.get(
-            f"{CORE_SERVICE_URL}/api/goals",
-            params={"user_id": user_id, "status": "active"}
-        )
-
-        if goals_response.status_code == 200:
-            goals = goals_response.json()
+        if isinstance(goals_response, Exception):
+            logger.error("Dashboard goals request failed: %s", goals_response)
+        elif goals_response.status_code == 200:
+            goals = orjson.loads(goals_response.content)
             if goals:
-                stats_lines.append("🎯 <b>Твои цели:</b>")
-                total_progress = sum(g.get("progress_percent", 0) for g in goals) / len(goals)
-                stats_lines.append(f"  Общий прогресс: <b>{total_progress:.0f}%</b>")
-
-                stats_lines.append(f"  Активных целей: <b>{len(goals)}</b>")
-
-                random_goal = random.choice(goals)
-                goal_title = random_goal.get("title", "")
-                goal_progress = random_goal.get("progress_percent", 0)
+                # Remind about the least advanced goal, found in the same pass as the total
+                progress_sum = 0
+                reminder_goal, goal_progress = goals[0], goals[0].get("progress_percent", 0)
+                for g in goals:
+                    progress = g.get("progress_percent", 0)
+                    progress_sum += progress
+                    if progress < goal_progress:
+                        reminder_goal, goal_progress = g, progress
+                total_progress = progress_sum / len(goals)
+                goal_title = reminder_goal.get("title", "")
 
                 if goal_progress < 30:
                     motivation = "Начни работать над ней сегодня! 💪"
@@ -531,23 +960,30 @@ async def get_dashboard_stats(user_id: str) -> str:
                 else:
                     motivation = "Ты почти у цели! 🚀"
 
-                stats_lines.append(f"\n💡 <i>Напоминаю о цели: {goal_title}</i>")
-                stats_lines.append(f"  {motivation}")
+                sections.append(
+                    "🎯 <b>Твои цели:</b>\n"
+                    f"  Общий прогресс: <b>{total_progress:.0f}%</b>\n"
+                    f"  Активных целей: <b>{len(goals)}</b>\n"
+                    "\n"
+                    f"💡 <i>Напоминаю о цели: {goal_title}</i>\n"
+                    f"  {motivation}"
+                )
             else:
-                stats_lines.append("🎯 <i>У тебя пока нет целей. Создай свою первую!</i>")
+                sections.append("🎯 <i>У тебя пока нет целей. Создай свою первую!</i>")
 
-        if not stats_lines:
+        if not sections:
             return "📊 <i>Пока нет данных для отображения</i>"
 
-        return "\n".join(stats_lines)
+        return "\n\n".join(sections)
 
-    except Exception as e:
-        logger.exception(f"Error getting dashboard stats: {e}")
+    except Exception:
+        logger.exception("Error getting dashboard stats")
         return "📊 <i>Не удалось загрузить статистику</i>"
 
 
 async def show_goals_for_user(chat_id: Optional[int], user_id: str, bot_instance: Bot):
-    await send_typing(bot_instance, chat_id)
+    # Typing indicator goes out alongside the Core request instead of before it
+    _spawn_background(send_typing(bot_instance, chat_id))
 
     try:
         response = await http_client.get(
@@ -556,13 +992,15 @@ async def show_goals_for_user(chat_id: Optional[int], user_id: str, bot_instance
         )
 
         if response.status_code == 200:
-            goals = response.json()
+            goals = orjson.loads(response.content)
 
             if goals:
                 rendered = render_goals_list(goals, title="🎯 Твои цели")
 
-                goal_buttons: List[List[CallbackButton]] = []
+                goal_buttons: List[Sequence[CallbackButton]] = []
                 for idx, goal in enumerate(goals, 1):
+                    # List entries carry steps, so the next view_goal click can skip a GET
+                    cache_goal(user_id, goal)
                     goal_id = goal.get("id")
                     goal_title = goal.get("title", "Без названия")
                     button_text = goal_title[:35] + "..." if len(goal_title) > 35 else goal_title
@@ -570,10 +1008,7 @@ async def show_goals_for_user(chat_id: Optional[int], user_id: str, bot_instance
                         CallbackButton(text=f"{idx}. {button_text}", payload=f"view_goal_{goal_id}")
                     ])
 
-                goal_buttons.append([
-                    CallbackButton(text="➕ Новая цель", payload="new_goal"),
-                    CallbackButton(text="🏠 Меню", payload="main_menu"),
-                ])
+                goal_buttons.append(GOALS_LIST_FOOTER_ROW)
 
                 keyboard = build_inline_keyboard(goal_buttons)
                 await bot_instance.send_message(
@@ -596,8 +1031,8 @@ async def show_goals_for_user(chat_id: Optional[int], user_id: str, bot_instance
         else:
             raise RuntimeError(f"Core Service returned {response.status_code}")
 
-    except Exception as e:
-        logger.exception(f"Error loading goals: {e}")
+    except Exception:
+        logger.exception("Error loading goals")
         keyboard = single_menu_button("🏠 Главное меню", "main_menu")
         await bot_instance.send_message(
             chat_id=chat_id,
@@ -610,12 +1045,10 @@ async def show_goals_for_user(chat_id: Optional[int], user_id: str, bot_instance
 
 
 async def show_events_for_user(chat_id: Optional[int], user_id: str, bot_instance: Bot):
-    await send_typing(bot_instance, chat_id)
+    _spawn_background(send_typing(bot_instance, chat_id))
 
     try:
-        from datetime import datetime, timedelta
-
-        today = datetime.now().date()
+        today = _today()
         week_end = today + timedelta(days=7)
 
         response = await http_client.get(
@@ -628,14 +1061,11 @@ async def show_events_for_user(chat_id: Optional[int], user_id: str, bot_instanc
         )
 
         if response.status_code == 200:
-            events = response.json()
+            events = orjson.loads(response.content)
 
             if events:
                 rendered = render_events(events, title="📅 События на этой неделе")
-                keyboard = keyboard_from_pairs([
-                    [("➕ Новое событие", "new_event"), ("🏠 Меню", "main_menu")],
-                    [("📅 Календарь", "calendar_view_week")],
-                ])
+                keyboard = events_list_keyboard()
                 await bot_instance.send_message(
                     chat_id=chat_id,
                     text=rendered,
@@ -643,11 +1073,7 @@ async def show_events_for_user(chat_id: Optional[int], user_id: str, bot_instanc
                     parse_mode=ParseMode.HTML
                 )
             else:
-                keyboard = keyboard_from_pairs([
-                    [("➕ Создать событие", "new_event")],
-                    [("📅 Календарь", "calendar_view_week")],
-                    [("🏠 Меню", "main_menu")],
-                ])
+                keyboard = events_empty_keyboard()
                 await bot_instance.send_message(
                     chat_id=chat_id,
                     text=(
@@ -660,8 +1086,8 @@ async def show_events_for_user(chat_id: Optional[int], user_id: str, bot_instanc
         else:
             raise RuntimeError(f"Core Service returned {response.status_code}")
 
-    except Exception as e:
-        logger.exception(f"Error loading events: {e}")
+    except Exception:
+        logger.exception("Error loading events")
         keyboard = single_menu_button("🏠 Главное меню", "main_menu")
         await bot_instance.send_message(
             chat_id=chat_id,
@@ -680,12 +1106,12 @@ async def cmd_start(event: MessageCreated):
     user = event.message.sender
     user_id = str(user.user_id)
 
-    track_event(user_id, "Bot Started", {
+    _track(track_event, user_id, "Bot Started", {
         "username": user.username,
         "first_name": user.first_name,
         "language_code": event.user_locale or "ru"
     })
-    set_user_profile(user_id, {
+    _track(set_user_profile, user_id, {
         "$name": user.full_name,
         "username": user.username,
         "language": event.user_locale or "ru"
@@ -744,35 +1170,30 @@ async def cmd_webapp(event: MessageCreated):
     await event.message.answer(message_text, parse_mode=ParseMode.HTML)
 
 
-@dp.message_callback(F.callback.payload == "show_goals")
 async def callback_show_goals(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     await show_goals_for_user(callback.message.recipient.chat_id, user_id, callback.message.bot)
 
 
-@dp.message_callback(F.callback.payload == "show_events")
 async def callback_show_events(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     await show_events_for_user(callback.message.recipient.chat_id, user_id, callback.message.bot)
 
 
-@dp.message_callback(F.callback.payload == "show_stats")
 async def callback_show_stats(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     await show_personal_stats(callback.message.recipient.chat_id, user_id, callback.message.bot)
 
 
-@dp.message_callback(F.callback.payload == "leaderboard")
 async def callback_show_leaderboard(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     await show_leaderboard(callback.message.recipient.chat_id, user_id, callback.message.bot)
 
 
-@dp.message_callback(F.callback.payload == "calendar_link")
 async def callback_calendar_link(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     chat_id = callback.message.recipient.chat_id
-    await send_typing(callback.message.bot, chat_id)
+    _spawn_background(send_typing(callback.message.bot, chat_id))
 
     link = await fetch_calendar_link(user_id)
     if link:
@@ -788,9 +1209,7 @@ async def callback_calendar_link(callback: MessageCallback):
             "Попробуй позже или убедись, что сервис календаря запущен."
         )
 
-    keyboard = keyboard_from_pairs([
-        [("📅 События", "show_events"), ("🏠 Меню", "main_menu")],
-    ])
+    keyboard = events_menu_keyboard()
     await callback.message.bot.send_message(
         chat_id=chat_id,
         text=text,
@@ -799,11 +1218,10 @@ async def callback_calendar_link(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload == "import_calendar")
 async def callback_import_calendar(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
     chat_id = callback.message.recipient.chat_id
-    await send_typing(callback.message.bot, chat_id)
+    _spawn_background(send_typing(callback.message.bot, chat_id))
 
     text = (
         "📥 <b>Импорт внешнего календаря</b>\n\n"
@@ -814,9 +1232,7 @@ async def callback_import_calendar(callback: MessageCallback):
         "После добавления календарь будет автоматически синхронизироваться каждые 10 секунд."
     )
 
-    keyboard = keyboard_from_pairs([
-        [("🏠 Меню", "main_menu")],
-    ])
+    keyboard = single_menu_button("🏠 Меню", "main_menu")
 
     # Set user state to expect calendar URL
     user_states[user_id] = {"action": "awaiting_calendar_url"}
@@ -829,10 +1245,9 @@ async def callback_import_calendar(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload.in_({"calendar_view_today", "calendar_view_week", "calendar_view_month"}))
 async def callback_calendar_view(callback: MessageCallback):
     user_id = str(callback.callback.user.user_id)
-    period = callback.callback.payload.split("_")[-1]
+    period = callback.callback.payload.rsplit("_", 1)[-1]
     text = await build_calendar_overview(user_id, period)
     keyboard = calendar_view_keyboard(period)
     await callback.message.edit(
@@ -842,7 +1257,6 @@ async def callback_calendar_view(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload == "new_goal")
 async def callback_new_goal(callback: MessageCallback):
     await callback.message.answer(
         "💡 Отлично! Расскажи мне о своей цели.\n\n"
@@ -854,7 +1268,6 @@ async def callback_new_goal(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload == "new_event")
 async def callback_new_event(callback: MessageCallback):
     await callback.message.answer(
         "📅 Создам событие! Скажи мне:\n\n"
@@ -865,23 +1278,45 @@ async def callback_new_event(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload == "main_menu")
-async def callback_main_menu(callback: MessageCallback):
-    user_id = str(callback.callback.user.user_id)
-
+async def _put_session(user_id: str, state: str, context: Dict[str, Any], expiry_hours: int) -> bool:
+    """Write the user's dialog state to Context; False (already logged) if it didn't stick."""
+    # Cached replies were computed under the previous dialog state
+    invalidate_reply_cache(user_id)
     try:
-        await http_client.put(
+        response = await http_client.put(
             f"{CONTEXT_SERVICE_URL}/api/session/{user_id}",
-            json={
-                "current_state": "idle",
-                "context": {},
-                "expiry_hours": 1
-            }
+            **_json_body({
+                "current_state": state,
+                "context": context,
+                "expiry_hours": expiry_hours
+            })
         )
-    except Exception as e:
-        logger.error(f"Error resetting session state: {e}")
+    except httpx.HTTPError as e:
+        logger.error("[%s] Session update to %s failed: %s", user_id, state, e)
+        return False
+    if response.status_code >= 400:
+        logger.error(
+            "[%s] Session update to %s failed: %s %s",
+            user_id, state, response.status_code, _body_preview(response),
+        )
+        return False
+    return True
+
+
+async def callback_main_menu(callback: MessageCallback):
+    user_id = str(callback.callback.user.user_id)
+
+    # Session reset and dashboard stats are independent; overlap them.
+    # A failed reset is logged by _put_session and doesn't block the menu
+    _, stats = await asyncio.gather(
+        _put_session(user_id, "idle", {}, 1),
+        get_dashboard_stats(user_id),
+        return_exceptions=True,
+    )
+    if isinstance(stats, Exception):
+        logger.error("Error loading dashboard stats: %s", stats)
+        stats = ""
 
-    stats = await get_dashboard_stats(user_id)
     keyboard = main_menu_keyboard()
 
     await callback.message.edit(
@@ -895,288 +1330,352 @@ async def callback_main_menu(callback: MessageCallback):
     )
 
 
-@dp.message_callback(F.callback.payload.startswith("view_goal_"))
-async def callback_view_goal(callback: MessageCallback):
-    goal_id = callback.callback.payload.split("_")[-1]
-    user_id = str(callback.callback.user.user_id)
+# Fixed callback payloads are routed with one filter + dict lookup instead of an
+# equality check per handler
+_EXACT_CALLBACK_HANDLERS = {
+    "show_goals": callback_show_goals,
+    "show_events": callback_show_events,
+    "show_stats": callback_show_stats,
+    "leaderboard": callback_show_leaderboard,
+    "calendar_link": callback_calendar_link,
+    "import_calendar": callback_import_calendar,
+    "calendar_view_today": callback_calendar_view,
+    "calendar_view_week": callback_calendar_view,
+    "calendar_view_month": callback_calendar_view,
+    "new_goal": callback_new_goal,
+    "new_event": callback_new_event,
+    "main_menu": callback_main_menu,
+}
+
+
+@dp.message_callback(F.callback.payload.in_(_EXACT_CALLBACK_HANDLERS.keys()))
+async def callback_exact_dispatch(callback: MessageCallback):
+    await _EXACT_CALLBACK_HANDLERS[callback.callback.payload](callback)
+
+
+def _step_button(goal_id: Any, step_id: Any, step_status: str, step_title: str) -> CallbackButton:
+    """Single step toggle button; the payload is parsed back by callback_toggle_step."""
+    emoji = STEP_STATUS_EMOJI.get(step_status, "⭕")
+    text = step_title[:40] + "..." if len(step_title) > 40 else step_title
+    return CallbackButton(text=f"{emoji} {text}", payload=f"toggle_step_{step_id}_{goal_id}")
+
+
+@functools.lru_cache(maxsize=256)
+def _goal_steps_keyboard(goal_id: Any, steps: Tuple[Tuple[Any, str, str], ...]):
+    """Step toggle keyboard for a goal; steps are (id, status, title) tuples."""
+    step_buttons: List[Sequence[CallbackButton]] = [
+        [_step_button(goal_id, *step)] for step in steps
+    ]
+    step_buttons.append([
+        CallbackButton(text="✏️ Поправить шаги", payload=f"edit_goal_steps_{goal_id}")
+    ])
+    step_buttons.append(GOAL_DETAIL_NAV_ROW)
 
-    await send_typing(callback.message.bot, callback.message.recipient.chat_id)
+    return build_inline_keyboard(step_buttons)
 
-    try:
-        response = await http_client.get(
-            f"{CORE_SERVICE_URL}/api/goals/{goal_id}",
-            params={"user_id": user_id}
-        )
 
-        if response.status_code == 200:
-            goal = response.json()
-            rendered = render_goal_detail(goal)
-
-            steps = goal.get("steps", [])
-            step_buttons: List[List[CallbackButton]] = []
-            for step in steps:
-                step_id = step.get("id")
-                step_status = step.get("status", "pending")
-                step_title = step.get("title", "")
-
-                if step_status == "completed":
-                    emoji = "✅"
-                elif step_status == "in_progress":
-                    emoji = "🔄"
-                else:
-                    emoji = "⭕"
+async def _render_goal_view(callback: MessageCallback, goal: Dict[str, Any]):
+    """Render goal detail with step toggles into the callback's message."""
+    rendered = render_goal_detail(goal)
+    keyboard = _goal_steps_keyboard(
+        goal.get("id"),
+        tuple(
+            (step.get("id"), step.get("status", "pending"), step.get("title", ""))
+            for step in goal.get("steps", [])
+        ),
+    )
+    await callback.message.edit(
+        text=rendered,
+        attachments=_attachments(keyboard),
+        parse_mode=ParseMode.HTML
+    )
 
-                text = step_title[:40] + "..." if len(step_title) > 40 else step_title
-                step_buttons.append([
-                    CallbackButton(text=f"{emoji} {text}", payload=f"toggle_step_{step_id}_{goal_id}")
-                ])
 
-            step_buttons.append([
-                CallbackButton(text="✏️ Поправить шаги", payload=f"edit_goal_steps_{goal_id}")
-            ])
-            step_buttons.append([
-                CallbackButton(text="◀️ К списку целей", payload="show_goals"),
-                CallbackButton(text="🏠 Меню", payload="main_menu"),
-            ])
+async def callback_view_goal(callback: MessageCallback):
+    goal_id = callback.callback.payload.rsplit("_", 1)[-1]
+    user_id = str(callback.callback.user.user_id)
 
-            keyboard = build_inline_keyboard(step_buttons)
-            await callback.message.edit(
-                text=rendered,
-                attachments=_attachments(keyboard),
-                parse_mode=ParseMode.HTML
-            )
+    _spawn_background(send_typing(callback.message.bot, callback.message.recipient.chat_id))
+
+    try:
+        goal = await fetch_goal(user_id, goal_id)
+
+        if goal:
+            await _render_goal_view(callback, goal)
         else:
             await callback.message.edit(
                 text="😔 Не удалось загрузить цель.\n\nПопробуй ещё раз.",
                 parse_mode=ParseMode.HTML
             )
 
-    except Exception as e:
-        logger.exception(f"Error loading goal {goal_id}: {e}")
+    except Exception:
+        logger.exception("Error loading goal %s", goal_id)
         await callback.message.edit(
             text="😔 Произошла ошибка при загрузке цели.",
             parse_mode=ParseMode.HTML
         )
 
 
-@dp.message_callback(F.callback.payload.startswith("edit_goal_steps_"))
 async def callback_edit_goal_steps(callback: MessageCallback):
-    goal_id = callback.callback.payload.split("_")[-1]
+    goal_id = callback.callback.payload.rsplit("_", 1)[-1]
     user_id = str(callback.callback.user.user_id)
 
     try:
-        goal_response = await http_client.get(
-            f"{CORE_SERVICE_URL}/api/goals/{goal_id}",
-            params={"user_id": user_id}
-        )
+        goal = await fetch_goal(user_id, goal_id)
 
-        if goal_response.status_code == 200:
-            goal = goal_response.json()
+        if goal:
             goal_title = goal.get("title", "цели")
 
-            await http_client.put(
-                f"{CONTEXT_SERVICE_URL}/api/session/{user_id}",
-                json={
-                    "current_state": "editing_goal_steps",
-                    "context": {
-                        "editing_goal_id": int(goal_id),
-                        "goal_title": goal_title
-                    },
-                    "expiry_hours": 2
-                }
-            )
-
             keyboard = build_inline_keyboard([
                 [CallbackButton(text="❌ Отменить редактирование", payload=f"cancel_edit_{goal_id}")],
-                [CallbackButton(text="🏠 Главное меню", payload="main_menu")]
+                MAIN_MENU_ROW
             ])
 
-            await callback.message.edit(
-                text=(
-                    "✏️ <b>Режим редактирования шагов</b>\n\n"
-                    f"Цель: <i>{goal_title}</i>\n\n"
-                    "Теперь ты можешь попросить меня:\n"
-                    "• Добавить новый шаг\n"
-                    "• Изменить формулировку шага\n"
-                    "• Удалить шаг\n"
-                    "• Изменить порядок шагов\n\n"
-                    "Просто напиши мне что нужно изменить, например:\n"
-                    "<i>\"Добавь шаг: изучить основы Python\"</i>\n"
-                    "<i>\"Удали третий шаг\"</i>\n"
-                    "<i>\"Переформулируй первый шаг на более простой язык\"</i>\n\n"
-                    "💡 Я работаю только с этой целью, пока ты не выйдешь из режима редактирования."
+            # The session write and the prompt are independent; overlap them, but
+            # take the prompt back if edit mode didn't actually stick
+            session_ok, _ = await asyncio.gather(
+                _put_session(
+                    user_id,
+                    "editing_goal_steps",
+                    {"editing_goal_id": int(goal_id), "goal_title": goal_title},
+                    2,
+                ),
+                callback.message.edit(
+                    text=(
+                        "✏️ <b>Режим редактирования шагов</b>\n\n"
+                        f"Цель: <i>{goal_title}</i>\n\n"
+                        "Теперь ты можешь попросить меня:\n"
+                        "• Добавить новый шаг\n"
+                        "• Изменить формулировку шага\n"
+                        "• Удалить шаг\n"
+                        "• Изменить порядок шагов\n\n"
+                        "Просто напиши мне что нужно изменить, например:\n"
+                        "<i>\"Добавь шаг: изучить основы Python\"</i>\n"
+                        "<i>\"Удали третий шаг\"</i>\n"
+                        "<i>\"Переформулируй первый шаг на более простой язык\"</i>\n\n"
+                        "💡 Я работаю только с этой целью, пока ты не выйдешь из режима редактирования."
+                    ),
+                    attachments=_attachments(keyboard),
+                    parse_mode=ParseMode.HTML
                 ),
-                attachments=_attachments(keyboard),
-                parse_mode=ParseMode.HTML
             )
+            if not session_ok:
+                await callback.message.edit(
+                    text="😔 Не удалось включить режим редактирования.\n\nПопробуй ещё раз.",
+                    attachments=_attachments(build_inline_keyboard([
+                        [CallbackButton(text="◀️ Вернуться к шагам", payload=f"view_goal_{goal_id}")],
+                        MAIN_MENU_ROW
+                    ])),
+                    parse_mode=ParseMode.HTML
+                )
         else:
             await callback.message.bot.send_message(
                 chat_id=callback.message.recipient.chat_id,
                 text="Не удалось загрузить цель"
             )
 
-    except Exception as e:
-        logger.exception(f"Error entering edit mode for goal {goal_id}: {e}")
+    except Exception:
+        logger.exception("Error entering edit mode for goal %s", goal_id)
         await callback.message.bot.send_message(
             chat_id=callback.message.recipient.chat_id,
             text="Произошла ошибка"
         )
 
 
-@dp.message_callback(F.callback.payload.startswith("cancel_edit_"))
 async def callback_cancel_edit(callback: MessageCallback):
-    goal_id = callback.callback.payload.split("_")[-1]
+    goal_id = callback.callback.payload.rsplit("_", 1)[-1]
     user_id = str(callback.callback.user.user_id)
 
     try:
-        await http_client.put(
-            f"{CONTEXT_SERVICE_URL}/api/session/{user_id}",
-            json={
-                "current_state": "idle",
-                "context": {},
-                "expiry_hours": 1
-            }
-        )
-
-        keyboard = build_inline_keyboard([
-            [CallbackButton(text="◀️ Вернуться к шагам", payload=f"view_goal_{goal_id}")],
-            [CallbackButton(text="🏠 Главное меню", payload="main_menu")]
-        ])
-
+        # Only claim the user left edit mode once the session actually says so
+        if await _put_session(user_id, "idle", {}, 1):
+            text = "✅ Вы вышли из режима редактирования."
+            keyboard = build_inline_keyboard([
+                [CallbackButton(text="◀️ Вернуться к шагам", payload=f"view_goal_{goal_id}")],
+                MAIN_MENU_ROW
+            ])
+        else:
+            text = "😔 Не удалось выйти из режима редактирования.\n\nПопробуй ещё раз."
+            keyboard = build_inline_keyboard([
+                [CallbackButton(text="❌ Отменить редактирование", payload=f"cancel_edit_{goal_id}")],
+                MAIN_MENU_ROW
+            ])
         await callback.message.edit(
-            text="✅ Вы вышли из режима редактирования.",
+            text=text,
             attachments=_attachments(keyboard),
             parse_mode=ParseMode.HTML
         )
 
-    except Exception as e:
-        logger.exception(f"Error cancelling edit mode: {e}")
+    except Exception:
+        logger.exception("Error cancelling edit mode")
         await callback.message.bot.send_message(
             chat_id=callback.message.recipient.chat_id,
             text="Произошла ошибка"
         )
 
 
-@dp.message_callback(F.callback.payload.startswith("toggle_step_"))
 async def callback_toggle_step(callback: MessageCallback):
-    parts = callback.callback.payload.split("_")
-    step_id = parts[2]
-    goal_id = parts[3]
+    # toggle_step_{step_id}_{goal_id}
+    _, _, step_id, goal_id = callback.callback.payload.split("_", 3)
     user_id = str(callback.callback.user.user_id)
 
-    try:
-        goal_response = await http_client.get(
-            f"{CORE_SERVICE_URL}/api/goals/{goal_id}",
-            params={"user_id": user_id}
-        )
-
-        if goal_response.status_code == 200:
-            goal = goal_response.json()
-            steps = goal.get("steps", [])
+    # Serialize a user's toggles so rapid taps don't read-modify-write the same step concurrently
+    async with _user_lock(user_id):
+        try:
+            goal = await fetch_goal(user_id, goal_id)
 
-            current_step = next((step for step in steps if str(step.get("id")) == step_id), None)
-            if not current_step:
-                await callback.message.bot.send_message(
-                    chat_id=callback.message.recipient.chat_id,
-                    text="Шаг не найден"
-                )
-                return
+            if goal:
+                steps = goal.get("steps", [])
 
-            current_status = current_step.get("status", "pending")
-            new_status = "completed" if current_status != "completed" else "pending"
+                steps_by_id = {str(step.get("id")): step for step in steps}
+                current_step = steps_by_id.get(step_id)
+                if not current_step:
+                    await callback.message.bot.send_message(
+                        chat_id=callback.message.recipient.chat_id,
+                        text="Шаг не найден"
+                    )
+                    return
 
-            update_response = await http_client.put(
-                f"{CORE_SERVICE_URL}/api/steps/{step_id}/status",
-                json={"status": new_status, "user_id": user_id}
-            )
+                current_status = current_step.get("status", "pending")
+                new_status = "completed" if current_status != "completed" else "pending"
 
-            if update_response.status_code == 200:
-                updated_goal_response = await http_client.get(
-                    f"{CORE_SERVICE_URL}/api/goals/{goal_id}",
-                    params={"user_id": user_id}
+                update_response = await http_client.put(
+                    f"{CORE_SERVICE_URL}/api/steps/{step_id}/status",
+                    **_json_body({"status": new_status, "user_id": user_id})
                 )
 
-                if updated_goal_response.status_code == 200:
-                    updated_goal = updated_goal_response.json()
-                    rendered = render_goal_detail(updated_goal)
-
-                    updated_buttons: List[List[CallbackButton]] = []
-                    for step in updated_goal.get("steps", []):
-                        s_id = step.get("id")
-                        s_status = step.get("status", "pending")
-                        s_title = step.get("title", "")
-
-                        if s_status == "completed":
-                            emoji = "✅"
-                        elif s_status == "in_progress":
-                            emoji = "🔄"
-                        else:
-                            emoji = "⭕"
-
-                        text = s_title[:40] + "..." if len(s_title) > 40 else s_title
-                        updated_buttons.append([
-                            CallbackButton(text=f"{emoji} {text}", payload=f"toggle_step_{s_id}_{goal_id}")
-                        ])
-
-                    updated_buttons.append([
-                        CallbackButton(text="◀️ К списку целей", payload="show_goals"),
-                        CallbackButton(text="🏠 Меню", payload="main_menu"),
-                    ])
-
-                    keyboard = build_inline_keyboard(updated_buttons)
-                    await callback.message.edit(
-                        text=rendered,
-                        attachments=_attachments(keyboard),
-                        parse_mode=ParseMode.HTML
-                    )
+                invalidate_goal_cache(user_id, goal_id)
+
+                if update_response.status_code == 200:
+                    # Core returns the updated step; patch a copy of the goal we already
+                    # have instead of re-fetching it (progress mirrors Goal.update_progress)
+                    updated_step = {**current_step, **orjson.loads(update_response.content)}
+                    updated_steps = [updated_step if step is current_step else step for step in steps]
+                    completed = sum(1 for step in updated_steps if step.get("status") == "completed")
+                    updated_goal = {
+                        **goal,
+                        "steps": updated_steps,
+                        "progress_percent": completed / len(updated_steps) * 100,
+                    }
+                    # Re-seed the cache so the next tap on this goal skips the GET
+                    cache_goal(user_id, updated_goal)
+                    await _render_goal_view(callback, updated_goal)
                 else:
                     await callback.message.bot.send_message(
                         chat_id=callback.message.recipient.chat_id,
-                        text="Не удалось обновить цель"
+                        text="Не удалось обновить шаг"
                     )
             else:
                 await callback.message.bot.send_message(
                     chat_id=callback.message.recipient.chat_id,
-                    text="Не удалось обновить шаг"
+                    text="Не удалось загрузить цель"
                 )
-        else:
+
+        except Exception:
+            logger.exception("Error toggling step %s", step_id)
             await callback.message.bot.send_message(
                 chat_id=callback.message.recipient.chat_id,
-                text="Не удалось загрузить цель"
+                text="Произошла ошибка"
             )
 
-    except Exception as e:
-        logger.exception(f"Error toggling step {step_id}: {e}")
-        await callback.message.bot.send_message(
-            chat_id=callback.message.recipient.chat_id,
-            text="Произошла ошибка"
-        )
 
+# Marker for batched callbacks whose result is superseded by a later tap
+_SUPERSEDED = object()
+# Pending taps keyed by (user_id, message id): only taps on the same message supersede each other
+_pending_callbacks: Dict[Tuple[str, str], List[Tuple[str, asyncio.Future]]] = {}
 
-@dp.message_callback(F.callback.payload.startswith(("schedule_", "time_pref", "day_pref")))
-async def callback_scheduling(callback: MessageCallback):
-    user_id = str(callback.callback.user.user_id)
-    payload = callback.callback.payload
 
-    try:
+async def _orchestrator_callback(user_id: str, message_id: str, payload: str) -> Any:
+    """
+    Forward a callback to the orchestrator and return its result dict (None on error).
+
+    With CALLBACK_BATCH_WINDOW set, a user's taps on the same message arriving
+    within the window are sent as one ordered batch; all but the last resolve to
+    _SUPERSEDED, so only the final tap renders a result or an error.
+    """
+    if CALLBACK_BATCH_WINDOW <= 0:
         response = await http_client.post(
             f"{ORCHESTRATOR_URL}/api/callback",
-            json={
+            **_json_body({
                 "user_id": user_id,
                 "callback_data": payload
-            },
+            }),
             timeout=30.0
         )
-
         if response.status_code != 200:
-            logger.error(f"Orchestrator callback error: {response.status_code}")
+            logger.error("Orchestrator callback error: %s", response.status_code)
+            return None
+        return orjson.loads(response.content)
+
+    future = asyncio.get_running_loop().create_future()
+    key = (user_id, message_id)
+    batch = _pending_callbacks.get(key)
+    if batch is None:
+        batch = _pending_callbacks[key] = []
+        _spawn_background(_flush_callbacks(key))
+    batch.append((payload, future))
+    return await future
+
+
+async def _flush_callbacks(key: Tuple[str, str]):
+    await asyncio.sleep(CALLBACK_BATCH_WINDOW)
+    batch = _pending_callbacks.pop(key, [])
+    if not batch:
+        return
+
+    user_id = key[0]
+    last = len(batch) - 1
+    try:
+        # Batches for different messages of one user still reach the orchestrator in order
+        async with _user_lock(user_id):
+            response = await http_client.post(
+                f"{ORCHESTRATOR_URL}/api/callbacks",
+                **_json_body({
+                    "user_id": user_id,
+                    "callbacks": [payload for payload, _ in batch]
+                }),
+                timeout=30.0
+            )
+        if response.status_code == 200:
+            results = orjson.loads(response.content).get("results", [])
+        else:
+            logger.error("Orchestrator batch callback error: %s", response.status_code)
+            results = []
+        final = results[last] if len(results) == len(batch) else None
+    except Exception as exc:
+        final = exc
+
+    # Earlier taps are superseded either way; only the last one reports the outcome
+    for idx, (_, future) in enumerate(batch):
+        if future.done():
+            continue
+        if idx < last:
+            future.set_result(_SUPERSEDED)
+        elif isinstance(final, Exception):
+            future.set_exception(final)
+        else:
+            future.set_result(final)
+
+
+async def callback_scheduling(callback: MessageCallback):
+    user_id = str(callback.callback.user.user_id)
+    payload = callback.callback.payload
+
+    try:
+        result = await _orchestrator_callback(user_id, callback.message.body.mid, payload)
+        invalidate_goal_cache(user_id)
+
+        if result is _SUPERSEDED:
+            # A later tap in the same batch renders the final state
+            return
+
+        if result is None:
             await callback.message.bot.send_message(
                 chat_id=callback.message.recipient.chat_id,
                 text="Произошла ошибка"
             )
             return
 
-        result = response.json()
         response_type = result.get("response_type", "text")
         text = result.get("text", "")
         buttons_data = result.get("buttons", [])
@@ -1186,18 +1685,11 @@ async def callback_scheduling(callback: MessageCallback):
             is_days = "day_pref" in payload
             row_size = 3 if is_days and len(buttons_data) > 4 else 2
 
-            rows: List[List[CallbackButton]] = []
-            current_row: List[CallbackButton] = []
-            for btn in buttons_data:
-                current_row.append(
-                    CallbackButton(text=btn["text"], payload=btn["callback_data"])
-                )
-                if len(current_row) >= row_size:
-                    rows.append(current_row)
-                    current_row = []
-
-            if current_row:
-                rows.append(current_row)
+            buttons = [
+                CallbackButton(text=btn["text"], payload=btn["callback_data"])
+                for btn in buttons_data
+            ]
+            rows = [buttons[i:i + row_size] for i in range(0, len(buttons), row_size)]
 
             keyboard = build_inline_keyboard(rows)
 
@@ -1213,15 +1705,40 @@ async def callback_scheduling(callback: MessageCallback):
                 parse_mode=ParseMode.HTML
             )
 
-    except Exception as e:
-        logger.exception(f"[{user_id}] Error handling scheduling callback: {e}")
+    except Exception:
+        logger.exception("[%s] Error handling scheduling callback", user_id)
         await callback.message.bot.send_message(
             chat_id=callback.message.recipient.chat_id,
             text="Произошла ошибка"
         )
 
 
-async def _download_attachment(attachment) -> Optional[bytes]:
+# Prefixed callbacks are routed by their first payload token: one filter + dict lookup
+# instead of a startswith() check per handler
+_PREFIX_CALLBACK_HANDLERS = {
+    "view": callback_view_goal,             # view_goal_{goal_id}
+    "edit": callback_edit_goal_steps,       # edit_goal_steps_{goal_id}
+    "cancel": callback_cancel_edit,         # cancel_edit_{goal_id}
+    "toggle": callback_toggle_step,         # toggle_step_{step_id}_{goal_id}
+    "schedule": callback_scheduling,        # schedule_accept:..., schedule_decline:...
+    "time": callback_scheduling,            # time_pref:..., time_pref_done:...
+    "day": callback_scheduling,             # day_pref:..., day_pref_done:...
+}
+_PREFIX_CALLBACK_FILTER = (
+    "view_goal_", "edit_goal_steps_", "cancel_edit_", "toggle_step_",
+    "schedule_", "time_pref", "day_pref",
+)
+
+
+@dp.message_callback(F.callback.payload.startswith(_PREFIX_CALLBACK_FILTER))
+async def callback_prefix_dispatch(callback: MessageCallback):
+    handler = _PREFIX_CALLBACK_HANDLERS.get(callback.callback.payload.partition("_")[0])
+    if handler:
+        await handler(callback)
+
+
+def _attachment_source(attachment) -> Optional[Tuple[str, Optional[Dict[str, str]]]]:
+    """Download URL and auth headers for a MAX attachment, if it has one."""
     payload = getattr(attachment, "payload", None)
     if not payload:
         return None
@@ -1232,42 +1749,76 @@ async def _download_attachment(attachment) -> Optional[bytes]:
         return None
 
     headers = {"Authorization": f"Bearer {token}"} if token else None
-    response = await http_client.get(url, headers=headers)
-    if response.status_code != 200:
-        return None
-    return response.content
+    return url, headers
+
+
+class VoiceTooLarge(Exception):
+    """Raised from the upload stream once a voice download passes MAX_VOICE_BYTES."""
+
+
+async def _capped_voice_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Pass download chunks through, aborting once the total exceeds MAX_VOICE_BYTES."""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > MAX_VOICE_BYTES:
+            raise VoiceTooLarge(received)
+        yield chunk
 
 
 async def process_voice_message(event: MessageCreated, audio_attachment):
     user_id = str(event.message.sender.user_id)
-    logger.info(f"[{user_id}] Received voice message")
+    logger.info("[%s] Received voice message", user_id)
 
-    await send_typing(event.message.bot, event.message.recipient.chat_id)
+    # Typing indicator doesn't gate anything; let it overlap with the download
+    _spawn_background(send_typing(event.message.bot, event.message.recipient.chat_id))
 
     try:
-        audio_bytes = await _download_attachment(audio_attachment)
-        if not audio_bytes:
+        source = _attachment_source(audio_attachment)
+        if not source:
             await event.message.answer("😔 Не удалось загрузить голосовое сообщение. Попробуй ещё раз.")
             return
 
-        track_event(user_id, "Message Received", {
+        url, download_headers = source
+        # Pipe the download straight into the transcription upload instead of
+        # buffering the whole file in memory first
+        async with http_client.stream("GET", url, headers=download_headers) as download:
+            if download.status_code != 200:
+                await event.message.answer("😔 Не удалось загрузить голосовое сообщение. Попробуй ещё раз.")
+                return
+
+            content_length = download.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > MAX_VOICE_BYTES:
+                logger.warning("[%s] Rejected voice download of %s bytes", user_id, content_length)
+                await event.message.answer(VOICE_TOO_LONG_TEXT)
+                return
+
+            upload_headers = {"Content-Type": "application/octet-stream"}
+            # aiter_bytes() yields decoded bytes, so the length only holds when unencoded
+            if content_length and not download.headers.get("Content-Encoding"):
+                upload_headers["Content-Length"] = content_length
+
+            transcribe_response = await http_client.post(
+                f"{LLM_SERVICE_URL}/api/transcribe",
+                # MAX attachments don't report a size, and chunked downloads carry
+                # no Content-Length, so the body itself is what gets capped
+                content=_capped_voice_stream(download.aiter_bytes()),
+                headers=upload_headers,
+                params={"user_id": user_id}
+            )
+
+        # Counted only once the upload went through, so rejected voice isn't a received message
+        _track(track_event, user_id, "Message Received", {
             "message_type": "voice",
         })
-        increment_user_counter(user_id, "total_messages", 1)
-
-        transcribe_response = await http_client.post(
-            f"{LLM_SERVICE_URL}/api/transcribe",
-            content=audio_bytes,
-            headers={"Content-Type": "application/octet-stream"},
-            params={"user_id": user_id}
-        )
+        _track(increment_user_counter, user_id, "total_messages", 1)
 
         if transcribe_response.status_code != 200:
-            logger.error(f"Transcription error: {transcribe_response.status_code} {transcribe_response.text}")
+            logger.error("Transcription error: %s %s", transcribe_response.status_code, _body_preview(transcribe_response))
             await event.message.answer("😔 Не удалось распознать голосовое сообщение. Попробуй ещё раз.")
             return
 
-        transcription = transcribe_response.json()
+        transcription = orjson.loads(transcribe_response.content)
         text = transcription.get("text")
         if not text:
             await event.message.answer("😔 Не удалось распознать голосовое сообщение. Попробуй ещё раз.")
@@ -1275,14 +1826,17 @@ async def process_voice_message(event: MessageCreated, audio_attachment):
 
         await handle_user_message(event, text_override=text)
 
+    except VoiceTooLarge as e:
+        logger.warning("[%s] Aborted voice download after %s bytes", user_id, e.args[0])
+        await event.message.answer(VOICE_TOO_LONG_TEXT)
     except httpx.TimeoutException:
-        logger.error(f"[{user_id}] Transcription timeout")
+        logger.error("[%s] Transcription timeout", user_id)
         await event.message.answer(
             "⏱️ Запрос занял слишком много времени.\n\n"
             "Пожалуйста, попробуй ещё раз."
         )
     except Exception:
-        logger.exception(f"[{user_id}] Error processing voice message")
+        logger.exception("[%s] Error processing voice message", user_id)
         await event.message.answer(
             "😔 Упс, произошла ошибка при обработке голосового сообщения.\n\n"
             "Попробуй ещё раз."
@@ -1297,7 +1851,7 @@ async def handle_calendar_url_input(event: MessageCreated, url: str):
     # Clear user state
     user_states.pop(user_id, None)
 
-    await send_typing(event.message.bot, chat_id)
+    _spawn_background(send_typing(event.message.bot, chat_id))
 
     # Validate URL
     if not (url.startswith("http://") or url.startswith("https://")):
@@ -1308,49 +1862,50 @@ async def handle_calendar_url_input(event: MessageCreated, url: str):
                 "Пожалуйста, отправь публичную ссылку на календарь (.ics), "
                 "которая начинается с http:// или https://"
             ),
-            attachments=_attachments(keyboard_from_pairs([[("🏠 Меню", "main_menu")]])),
+            attachments=_attachments(single_menu_button("🏠 Меню", "main_menu")),
             parse_mode=ParseMode.HTML,
         )
         return
 
-    if not CALENDAR_SERVICE_URL:
+    if calendar_client is None:
         await event.message.bot.send_message(
             chat_id=chat_id,
             text="😔 Сервис календаря недоступен. Попробуйте позже.",
-            attachments=_attachments(keyboard_from_pairs([[("🏠 Меню", "main_menu")]])),
+            attachments=_attachments(single_menu_button("🏠 Меню", "main_menu")),
             parse_mode=ParseMode.HTML,
         )
         return
 
     try:
         # Call calendar service to add external calendar
-        response = await http_client.post(
-            f"{CALENDAR_SERVICE_URL}/api/calendars/users/{user_id}/external",
-            json={"url": url},
+        response = await calendar_client.post(
+            f"/api/calendars/users/{user_id}/external",
+            **_json_body({"url": url}),
             timeout=10.0
         )
 
         if response.status_code == 200:
-            data = response.json()
+            # Synced events would be missing from cached events tables and views
+            invalidate_reply_cache(user_id)
+            invalidate_view_cache(user_id)
+            data = orjson.loads(response.content)
             text = (
                 "✅ <b>Календарь успешно добавлен!</b>\n\n"
                 f"Синхронизировано событий: {data.get('events_synced', 0)}\n\n"
                 "Календарь будет автоматически обновляться каждые 10 секунд."
             )
-            track_event(user_id, "External Calendar Added", {"url": url})
+            _track(track_event, user_id, "External Calendar Added", {"url": url})
         else:
-            logger.error(f"Failed to add external calendar: {response.status_code} {response.text}")
+            logger.error("Failed to add external calendar: %s %s", response.status_code, _body_preview(response))
             text = (
                 "❌ Не удалось добавить календарь.\n\n"
                 f"Ошибка: {response.json().get('detail', 'Unknown error')}"
             )
     except Exception as e:
-        logger.error(f"Error adding external calendar: {e}")
+        logger.error("Error adding external calendar: %s", e)
         text = "❌ Произошла ошибка при добавлении календаря. Попробуйте позже."
 
-    keyboard = keyboard_from_pairs([
-        [("📅 События", "show_events"), ("🏠 Меню", "main_menu")],
-    ])
+    keyboard = events_menu_keyboard()
     await event.message.bot.send_message(
         chat_id=chat_id,
         text=text,
@@ -1359,8 +1914,40 @@ async def handle_calendar_url_input(event: MessageCreated, url: str):
     )
 
 
+# Fixed replies for message-handler failures: kind -> (text, (button text, payload))
+_ERROR_REPLIES = {
+    "orchestrator": (
+        "😔 Упс, что-то пошло не так.\n\n"
+        "Попробуй ещё раз или вернись в главное меню.",
+        ("🏠 Вернуться в меню", "main_menu"),
+    ),
+    "timeout": (
+        "⏱️ Запрос занял слишком много времени.\n\n"
+        "Пожалуйста, попробуй ещё раз.",
+        ("🔄 Попробовать снова", "main_menu"),
+    ),
+    "http": (
+        "🔌 Не могу связаться с сервером.\n\n"
+        "Проверь подключение к интернету или попробуй позже.",
+        ("🏠 Главное меню", "main_menu"),
+    ),
+    "unknown": (
+        "😔 Упс, произошла непредвиденная ошибка.\n\n"
+        "Попробуй ещё раз или свяжись с поддержкой.",
+        ("🏠 Главное меню", "main_menu"),
+    ),
+}
+
+
+async def _reply_error(event: MessageCreated, kind: str):
+    text, (button_text, button_payload) = _ERROR_REPLIES[kind]
+    await event.message.answer(
+        text,
+        attachments=_attachments(single_menu_button(button_text, button_payload))
+    )
+
+
 async def handle_user_message(event: MessageCreated, text_override: Optional[str] = None):
-    user_id = str(event.message.sender.user_id)
     user_msg = text_override or (event.message.body.text or "").strip()
 
     if not user_msg:
@@ -1370,45 +1957,56 @@ async def handle_user_message(event: MessageCreated, text_override: Optional[str
     if user_msg.startswith('/'):
         return
 
+    user_id = str(event.message.sender.user_id)
+
     # Check if user is in a specific state (e.g., awaiting calendar URL)
     user_state = user_states.get(user_id)
     if user_state and user_state.get("action") == "awaiting_calendar_url":
         await handle_calendar_url_input(event, user_msg)
         return
 
-    logger.info(f"[{user_id}] Received: {user_msg[:50]}...")
+    logger.info("[%s] Received: %s...", user_id, user_msg[:50])
 
-    track_event(user_id, "Message Received", {
+    _track(track_event, user_id, "Message Received", {
         "message_type": "text",
         "message_length": len(user_msg)
     })
-    increment_user_counter(user_id, "total_messages", 1)
+    _track(increment_user_counter, user_id, "total_messages", 1)
 
-    await send_typing(event.message.bot, event.message.recipient.chat_id)
+    # Typing indicator goes out alongside the orchestrator request instead of before it
+    _spawn_background(send_typing(event.message.bot, event.message.recipient.chat_id))
 
     try:
-        response = await http_client.post(
-            f"{ORCHESTRATOR_URL}/api/process",
-            json={"user_id": user_id, "message": user_msg},
-            timeout=30.0
-        )
-
-        if response.status_code != 200:
-            logger.error(f"Orchestrator error: {response.status_code} {response.text}")
-            keyboard = keyboard_from_pairs([[ ("🏠 Вернуться в меню", "main_menu") ]])
-            await event.message.answer(
-                "😔 Упс, что-то пошло не так.\n\n"
-                "Попробуй ещё раз или вернись в главное меню.",
-                attachments=_attachments(keyboard)
+        reply_key = _reply_cache_key(user_id, user_msg)
+        result = get_cached_reply(reply_key)
+        if result is not None:
+            # Skipping the orchestrator also skips its history update; keep the LLM context whole
+            _spawn_background(_record_cached_turn(user_id, user_msg, result.get("text")))
+        else:
+            response = await http_client.post(
+                f"{ORCHESTRATOR_URL}/api/process",
+                **_json_body({"user_id": user_id, "message": user_msg}),
+                timeout=30.0
             )
-            return
+            # The orchestrator may have changed goals/steps on the user's behalf
+            invalidate_goal_cache(user_id)
 
-        result = response.json()
-        logger.info(f"[{user_id}] Orchestrator response: {result}")
+            if response.status_code != 200:
+                logger.error("Orchestrator error: %s %s", response.status_code, _body_preview(response))
+                await _reply_error(event, "orchestrator")
+                return
+
+            result = orjson.loads(response.content)
+            logger.info(
+                "[%s] Orchestrator response_type=%s items=%d",
+                user_id, result.get("response_type"), len(result.get("items") or ()),
+            )
+            if result.get("success") and result.get("cacheable"):
+                cache_reply(reply_key, result)
 
         if not result.get("success"):
             error = result.get("error", "Неизвестная ошибка")
-            keyboard = keyboard_from_pairs([[ ("🏠 Главное меню", "main_menu") ]])
+            keyboard = single_menu_button("🏠 Главное меню", "main_menu")
             await event.message.answer(
                 f"😔 Произошла ошибка: {error}\n\n"
                 "Попробуй переформулировать запрос или вернись в меню.",
@@ -1448,29 +2046,21 @@ async def handle_user_message(event: MessageCreated, text_override: Optional[str
         elif response_type == "table":
             items = result.get("items", [])
             if items:
-                first_item = items[0]
-                if first_item.get("date"):
-                    rendered = render_events(items, title=text or "События")
-                    keyboard = keyboard_from_pairs([[ ("➕ Новое событие", "new_event"), ("🏠 Меню", "main_menu") ]])
-                    await event.message.answer(
-                        rendered,
-                        attachments=_attachments(keyboard),
-                        parse_mode=ParseMode.HTML
-                    )
-                elif first_item.get("steps"):
-                    rendered = render_goals(items, title=text or "Цели")
-                    keyboard = keyboard_from_pairs([[ ("➕ Новая цель", "new_goal"), ("🏠 Меню", "main_menu") ]])
+                table = TABLE_RENDERERS.get(result.get("item_kind") or _guess_item_kind(items[0]))
+                if table:
+                    renderer, keyboard_builder, default_title = table
+                    keyboard = keyboard_builder() if keyboard_builder else None
+                    # Cached replies are the same dict, so a repeat view reuses the HTML
+                    rendered = result.get("_rendered")
+                    if rendered is None:
+                        rendered = renderer(items, title=text or default_title)
+                        if result.get("cacheable"):
+                            result["_rendered"] = rendered
                     await event.message.answer(
                         rendered,
                         attachments=_attachments(keyboard),
                         parse_mode=ParseMode.HTML
                     )
-                elif first_item.get("price"):
-                    rendered = render_products(items, title=text or "Товары")
-                    await event.message.answer(rendered, parse_mode=ParseMode.HTML)
-                elif first_item.get("product"):
-                    rendered = render_cart(items, title=text or "Корзина")
-                    await event.message.answer(rendered, parse_mode=ParseMode.HTML)
                 else:
                     await event.message.answer("Результаты найдены, но формат не поддерживается.")
         elif text:
@@ -1479,29 +2069,14 @@ async def handle_user_message(event: MessageCreated, text_override: Optional[str
                 await event.message.answer(msg, parse_mode=ParseMode.HTML)
 
     except httpx.TimeoutException:
-        logger.error(f"[{user_id}] Request timeout")
-        keyboard = keyboard_from_pairs([[ ("🔄 Попробовать снова", "main_menu") ]])
-        await event.message.answer(
-            "⏱️ Запрос занял слишком много времени.\n\n"
-            "Пожалуйста, попробуй ещё раз.",
-            attachments=_attachments(keyboard)
-        )
+        logger.error("[%s] Request timeout", user_id)
+        await _reply_error(event, "timeout")
     except httpx.RequestError as e:
-        logger.error(f"[{user_id}] HTTP error: {e}")
-        keyboard = keyboard_from_pairs([[ ("🏠 Главное меню", "main_menu") ]])
-        await event.message.answer(
-            "🔌 Не могу связаться с сервером.\n\n"
-            "Проверь подключение к интернету или попробуй позже.",
-            attachments=_attachments(keyboard)
-        )
+        logger.error("[%s] HTTP error: %s", user_id, e)
+        await _reply_error(event, "http")
     except Exception:
-        logger.exception(f"[{user_id}] Unexpected error")
-        keyboard = keyboard_from_pairs([[ ("🏠 Главное меню", "main_menu") ]])
-        await event.message.answer(
-            "😔 Упс, произошла непредвиденная ошибка.\n\n"
-            "Попробуй ещё раз или свяжись с поддержкой.",
-            attachments=_attachments(keyboard)
-        )
+        logger.exception("[%s] Unexpected error", user_id)
+        await _reply_error(event, "unknown")
 
 
 @dp.message_created(F.message.body.text & ~F.message.body.text.startswith('/'))
@@ -1523,17 +2098,28 @@ async def on_started():
 
 
 async def on_startup():
-    logger.info("🚀 Starting MAX Bot...")
-    logger.info(f"Orchestrator URL: {ORCHESTRATOR_URL}")
+    global _analytics_worker_task
 
-    try:
-        response = await http_client.get(f"{ORCHESTRATOR_URL}/health", timeout=5.0)
-        if response.status_code == 200:
-            logger.info("✅ Orchestrator is reachable")
-        else:
-            logger.warning(f"⚠️ Orchestrator returned {response.status_code}")
-    except Exception as e:
-        logger.warning(f"⚠️ Cannot reach Orchestrator: {e}")
+    logger.info("🚀 Starting MAX Bot...")
+    if _analytics_worker_task is None:
+        _analytics_worker_task = asyncio.create_task(_analytics_worker())
+    logger.info("Orchestrator URL: %s", ORCHESTRATOR_URL)
+
+    # Concurrent health checks each open their own pooled connection
+    responses = await asyncio.gather(
+        *(
+            http_client.get(f"{ORCHESTRATOR_URL}/health", timeout=5.0)
+            for _ in range(ORCHESTRATOR_WARM_CONNECTIONS)
+        ),
+        return_exceptions=True,
+    )
+    response = responses[0]
+    if isinstance(response, Exception):
+        logger.warning("⚠️ Cannot reach Orchestrator: %s", response)
+    elif response.status_code == 200:
+        logger.info("✅ Orchestrator is reachable")
+    else:
+        logger.warning("⚠️ Orchestrator returned %s", response.status_code)
 
     commands = [
         BotCommand(name="/start", description="🏠 Главное меню"),
@@ -1554,17 +2140,36 @@ async def on_startup():
 
 async def on_shutdown():
     logger.info("Shutting down MAX Bot...")
+    if _bg_tasks:
+        await asyncio.gather(*_bg_tasks, return_exceptions=True)
+    if _analytics_worker_task is not None:
+        try:
+            await asyncio.wait_for(_analytics_queue.join(), timeout=5.0)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d unsent analytics events", _analytics_queue.qsize())
+        _analytics_worker_task.cancel()
     await http_client.aclose()
+    if calendar_client is not None:
+        await calendar_client.aclose()
     await bot.close_session()
 
 
 async def main():
     from app.health_server import start_health_server
 
+    # maxapi creates its aiohttp session on the first API call from
+    # default_connection.kwargs; the connector needs the running loop, so it
+    # is attached here, before delete_webhook makes that first call
+    bot.default_connection.kwargs["connector"] = aiohttp.TCPConnector(
+        limit=BOT_CONNECTION_LIMIT,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+    )
+
     try:
         await bot.delete_webhook()
     except Exception as e:
-        logger.warning(f"Could not delete webhook: {e}")
+        logger.warning("Could not delete webhook: %s", e)
 
     # Start health check server in background
     health_runner = await start_health_server(port=8080)
@@ -1577,4 +2182,18 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # The gateway is pure async I/O; libuv's loop cuts per-callback overhead.
+    # uvloop has no Windows build, so local runs there keep the default loop.
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        # Python 3.12+: tasks that finish without suspending (cache hits,
+        # early returns) skip the scheduler round trip
+        eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+        if eager_task_factory is not None:
+            runner.get_loop().set_task_factory(eager_task_factory)
+        runner.run(main())
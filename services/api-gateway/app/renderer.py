@@ -1,8 +1,17 @@
 """
 Formatter for rendering events, goals, and products in Telegram HTML format
 """
+from datetime import datetime
 from typing import List, Dict, Any
 
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+# Goal status -> emoji; anything else (e.g. "active") falls back to 🎯
+GOAL_STATUS_EMOJI = {"completed": "✅", "archived": "📦"}
+
+# Step status -> emoji; "pending" and anything unknown fall back to ⭕
+STEP_STATUS_EMOJI = {"completed": "✅", "in_progress": "🔄"}
+
 
 def render_events(events: List[Dict[str, Any]], title: str = "События") -> str:
     """Render list of events as HTML table for Telegram"""
@@ -20,9 +29,8 @@ def render_events(events: List[Dict[str, Any]], title: str = "События") -
 
         # Format date nicely
         try:
-            from datetime import datetime
             date_obj = datetime.fromisoformat(date)
-            weekday = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date_obj.weekday()]
+            weekday = WEEKDAY_NAMES[date_obj.weekday()]
             date_formatted = f"{weekday}, {date_obj.strftime('%d.%m.%Y')}"
         except:
             date_formatted = date
@@ -51,15 +59,9 @@ def render_goals(goals: List[Dict[str, Any]], title: str = "Цели") -> str:
         progress = goal.get("progress_percent", 0)
         steps = goal.get("steps", [])
         steps_count = len(steps)
-        completed_steps = len([s for s in steps if s.get("status") == "completed"])
+        completed_steps = sum(1 for s in steps if s.get("status") == "completed")
 
-        # Status emoji
-        if status == "completed":
-            status_emoji = "✅"
-        elif status == "archived":
-            status_emoji = "📦"
-        else:
-            status_emoji = "🎯"
+        status_emoji = GOAL_STATUS_EMOJI.get(status, "🎯")
 
         # Progress bar (10 blocks)
         filled = int(progress / 10)
@@ -79,13 +81,7 @@ def render_goals(goals: List[Dict[str, Any]], title: str = "Цели") -> str:
             for step_idx, step in enumerate(steps[:3], 1):
                 step_title = step.get("title", "")
                 step_status = step.get("status", "pending")
-
-                if step_status == "completed":
-                    step_emoji = "✅"
-                elif step_status == "in_progress":
-                    step_emoji = "🔄"
-                else:
-                    step_emoji = "⭕"
+                step_emoji = STEP_STATUS_EMOJI.get(step_status, "⭕")
 
                 lines.append(f"         {step_emoji} <i>{step_title}</i>")
 
@@ -131,13 +127,7 @@ def render_goals_list(goals: List[Dict[str, Any]], title: str = "🎯 Твои 
         status = goal.get("status", "active")
         progress = goal.get("progress_percent", 0)
 
-        # Status emoji
-        if status == "completed":
-            status_emoji = "✅"
-        elif status == "archived":
-            status_emoji = "📦"
-        else:
-            status_emoji = "🎯"
+        status_emoji = GOAL_STATUS_EMOJI.get(status, "🎯")
 
         lines.append(f"{idx}. {status_emoji} <b>{goal_title}</b> ({progress:.0f}%)")
 
@@ -152,15 +142,9 @@ def render_goal_detail(goal: Dict[str, Any]) -> str:
     progress = goal.get("progress_percent", 0)
     steps = goal.get("steps", [])
     steps_count = len(steps)
-    completed_steps = len([s for s in steps if s.get("status") == "completed"])
+    completed_steps = sum(1 for s in steps if s.get("status") == "completed")
 
-    # Status emoji
-    if status == "completed":
-        status_emoji = "✅"
-    elif status == "archived":
-        status_emoji = "📦"
-    else:
-        status_emoji = "🎯"
+    status_emoji = GOAL_STATUS_EMOJI.get(status, "🎯")
 
     # Progress bar (10 blocks)
     filled = int(progress / 10)
@@ -179,13 +163,7 @@ def render_goal_detail(goal: Dict[str, Any]) -> str:
         for step_idx, step in enumerate(steps, 1):
             step_title = step.get("title", "")
             step_status = step.get("status", "pending")
-
-            if step_status == "completed":
-                step_emoji = "✅"
-            elif step_status == "in_progress":
-                step_emoji = "🔄"
-            else:
-                step_emoji = "⭕"
+            step_emoji = STEP_STATUS_EMOJI.get(step_status, "⭕")
 
             lines.append(f"{step_idx}. {step_emoji} <i>{step_title}</i>")
 
@@ -74,6 +74,12 @@ class SessionUpdate(BaseModel):
     expiry_hours: Optional[int] = 1
 
 
+class ContextToggle(BaseModel):
+    value: Any
+    current_state: Optional[str] = None
+    expiry_hours: Optional[int] = None
+
+
 class ProfileUpdate(BaseModel):
     timezone: Optional[str] = None
     language: Optional[str] = None
@@ -291,6 +297,51 @@ async def update_session(user_id: str, update: SessionUpdate):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.patch("/api/session/{user_id}/context/{key}/toggle")
+async def toggle_session_context_value(user_id: str, key: str, toggle: ContextToggle):
+    """
+    Atomically toggle a value's membership in a list stored in session context.
+    Replaces a client-side GET + PUT round-trip and its lost-update race.
+    """
+    try:
+        db = get_db()
+        with db.session_ctx() as session:
+            state = session.query(SessionState).filter(
+                SessionState.user_id == user_id
+            ).with_for_update().first()
+
+            if not state:
+                state = SessionState(user_id=user_id, context={})
+                session.add(state)
+            elif state.is_expired():
+                state.current_state = "idle"
+                state.context = {}
+
+            context = dict(state.context or {})
+            values = list(context.get(key) or [])
+            if toggle.value in values:
+                values.remove(toggle.value)
+            else:
+                values.append(toggle.value)
+            context[key] = values
+
+            # Assign a new dict so SQLAlchemy detects the JSON change
+            state.context = context
+            if toggle.current_state:
+                state.current_state = toggle.current_state
+            if toggle.expiry_hours:
+                state.set_expiry(hours=toggle.expiry_hours)
+
+            session.flush()
+            result = state.to_dict()
+
+        logger.info(f"Toggled {toggle.value} in session context '{key}' for user {user_id}")
+        return result
+    except Exception as e:
+        logger.error(f"Error toggling session context: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.delete("/api/session/{user_id}")
 async def reset_session(user_id: str):
     """Reset session to idle"""
@@ -4,6 +4,7 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Any, Dict, List, Optional
 from datetime import datetime, time as time_type, timezone
+import asyncio
 import logging
 import os
 
@@ -43,6 +44,7 @@ CALENDAR_SERVICE_URL = os.getenv("CALENDAR_SERVICE_URL")
 calendar_http_client: Optional[httpx.AsyncClient] = None
 DEFAULT_EVENT_TIME = time_type(hour=9, minute=0)
 DEFAULT_DURATION_MINUTES = 60
+CALENDAR_PUSH_CONCURRENCY = 10
 
 
 def _parse_calendar_user_id(raw_user_id: str) -> Optional[int]:
@@ -88,7 +90,11 @@ async def _ensure_calendar_for_user(user_id: str, name: Optional[str] = None) ->
         return None
 
 
-async def _push_event_to_calendar(event: Dict[str, Any], calendar_name: Optional[str] = None) -> None:
+async def _push_event_to_calendar(
+    event: Dict[str, Any],
+    calendar_name: Optional[str] = None,
+    calendar: Optional[Dict[str, Any]] = None,
+) -> None:
     if not CALENDAR_SERVICE_URL or not calendar_http_client:
         return
 
@@ -100,7 +106,8 @@ async def _push_event_to_calendar(event: Dict[str, Any], calendar_name: Optional
     if normalized_id is None:
         return
 
-    calendar = await _ensure_calendar_for_user(str(normalized_id), name=calendar_name)
+    if calendar is None:
+        calendar = await _ensure_calendar_for_user(str(normalized_id), name=calendar_name)
     if not calendar:
         return
 
@@ -122,8 +129,24 @@ async def _push_event_to_calendar(event: Dict[str, Any], calendar_name: Optional
 
 
 async def _push_events_batch(events: List[Dict[str, Any]], calendar_name: Optional[str] = None) -> None:
-    for event in events:
-        await _push_event_to_calendar(event, calendar_name=calendar_name)
+    if not events or not CALENDAR_SERVICE_URL or not calendar_http_client:
+        return
+
+    # Resolve each user's calendar once instead of once per event
+    calendars: Dict[str, Optional[Dict[str, Any]]] = {}
+    for user_id in {str(event["user_id"]) for event in events if event.get("user_id")}:
+        calendars[user_id] = await _ensure_calendar_for_user(user_id, name=calendar_name)
+
+    semaphore = asyncio.Semaphore(CALENDAR_PUSH_CONCURRENCY)
+
+    async def _push(event: Dict[str, Any]) -> None:
+        calendar = calendars.get(str(event.get("user_id")))
+        if not calendar:
+            return
+        async with semaphore:
+            await _push_event_to_calendar(event, calendar_name=calendar_name, calendar=calendar)
+
+    await asyncio.gather(*(_push(event) for event in events))
 
 # Database initialization
 @app.on_event("startup")
@@ -544,21 +567,21 @@ async def update_step(step_id: int, user_id: str, update: StepUpdate):
 
 @app.delete("/api/steps/{step_id}")
 async def delete_step(step_id: int, user_id: str):
-    """Delete a step"""
+    """Delete a step (response includes the parent goal_id)"""
     try:
         db = get_db()
         with db.session_ctx() as session:
-            success = goals_service.delete_step(
+            goal_id = goals_service.delete_step(
                 session=session,
                 step_id=step_id,
                 user_id=user_id
             )
 
-        if not success:
+        if goal_id is None:
             raise HTTPException(status_code=404, detail="Step not found")
 
         logger.info(f"Deleted step {step_id}")
-        return {"status": "deleted", "id": step_id}
+        return {"status": "deleted", "id": step_id, "goal_id": goal_id}
     except HTTPException:
         raise
     except Exception as e:
@@ -945,3 +968,15 @@ async def get_leaderboard(limit: int = 20):
     except Exception as e:
         logger.error(f"Error getting leaderboard: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/leaderboard/goals")
+async def get_goals_leaderboard(me: str, limit: int = 10):
+    """Per-user goal progress for the bot leaderboard (requesting user always included)"""
+    try:
+        db = get_db()
+        with db.session_ctx() as session:
+            return goals_service.leaderboard_goal_summaries(session, me=me, limit=limit)
+    except Exception as e:
+        logger.error(f"Error getting goals leaderboard: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
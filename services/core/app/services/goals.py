@@ -1,9 +1,15 @@
+import logging
 from typing import List, Dict, Any, Optional
-from datetime import date as date_type
+from datetime import date as date_type, datetime, time as time_type, timedelta
 from dateutil import parser as dtparser
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
+from app.models.event import Event
 from app.models.goal import Goal, Step
+from app.models.user import User
+
+logger = logging.getLogger("core_service")
 
 
 def parse_date(date_str: str) -> date_type:
@@ -75,6 +81,64 @@ def list_goals(
     return [goal.to_dict() for goal in q.all()]
 
 
+def leaderboard_goal_summaries(
+    session: Session,
+    me: str,
+    limit: int = 10,
+    goals_per_user: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Goal totals for the bot leaderboard: the requesting user plus the first
+    notification-enabled users, aggregated in a single grouped query.
+    Only each user's latest `goals_per_user` goals count, the same window
+    list_goals returns, so the gateway's per-user fallback ranks identically.
+    """
+    others = (
+        session.query(User.user_id)
+        .filter(User.notification_enabled == True, User.user_id != me)
+        .limit(max(limit - 1, 0))
+        .all()
+    )
+    user_ids = [me, *(user_id for (user_id,) in others)]
+
+    latest = (
+        session.query(
+            Goal.user_id,
+            Goal.status,
+            Goal.progress_percent,
+            func.row_number().over(
+                partition_by=Goal.user_id,
+                order_by=Goal.created_at.desc()
+            ).label("position"),
+        )
+        .filter(Goal.user_id.in_(user_ids))
+        .subquery()
+    )
+    rows = (
+        session.query(
+            latest.c.user_id,
+            func.count(),
+            func.sum(case((latest.c.status == "completed", 1), else_=0)),
+            func.avg(func.coalesce(latest.c.progress_percent, 0.0)),
+        )
+        .filter(latest.c.position <= goals_per_user)
+        .group_by(latest.c.user_id)
+        .all()
+    )
+    totals = {user_id: (total, completed, avg) for user_id, total, completed, avg in rows}
+
+    summaries = []
+    for user_id in user_ids:
+        total, completed, avg = totals.get(user_id, (0, 0, 0.0))
+        summaries.append({
+            "user_id": user_id,
+            "avg_progress": float(avg or 0.0),
+            "completed": int(completed or 0),
+            "total": total,
+        })
+    return summaries
+
+
 def update_goal(
     session: Session,
     goal_id: int,
@@ -179,8 +243,7 @@ def update_step_status(
     step.status = status
 
     if status == "completed":
-        from datetime import date
-        step.completed_at = date.today()
+        step.completed_at = date_type.today()
 
     session.flush()
 
@@ -220,15 +283,19 @@ def delete_step(
     session: Session,
     step_id: int,
     user_id: str
-) -> bool:
-    """Delete a step and recalculate goal progress"""
+) -> Optional[int]:
+    """Delete a step and recalculate goal progress
+
+    Returns the parent goal ID so callers don't need a separate lookup,
+    or None if the step was not found.
+    """
     step = session.query(Step).join(Goal).filter(
         Step.id == step_id,
         Goal.user_id == user_id
     ).first()
 
     if not step:
-        return False
+        return None
 
     goal = step.goal
     session.delete(step)
@@ -238,7 +305,7 @@ def delete_step(
     goal.update_progress()
     session.flush()
 
-    return True
+    return goal.id
 
 
 # ==================== SCHEDULING FUNCTIONS ====================
@@ -269,12 +336,6 @@ def schedule_steps(
     Returns:
         Goal dict with scheduled steps and created events
     """
-    from app.models.event import Event
-    from datetime import time as time_type
-    import logging
-
-    logger = logging.getLogger("core_service")
-
     # Verify goal ownership
     goal = session.query(Goal).filter(
         Goal.id == goal_id,
@@ -310,7 +371,6 @@ def schedule_steps(
 
         if planned_time_str:
             # Parse time
-            from dateutil import parser as dtparser
             t = dtparser.parse(planned_time_str).time()
             step.planned_time = t.replace(second=0, microsecond=0)
 
@@ -361,6 +421,15 @@ def schedule_steps(
     return result
 
 
+WEEKDAY_KEYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _slot_time(time_str: str) -> time_type:
+    """Parse a "HH:MM" slot label into a time"""
+    hours, minutes = time_str.split(":")
+    return time_type(int(hours), int(minutes))
+
+
 def get_free_time_slots(
     session: Session,
     user_id: str,
@@ -386,9 +455,6 @@ def get_free_time_slots(
     Returns:
         List of free slots: [{"date": "2025-11-15", "time": "10:00", "duration_minutes": 120}, ...]
     """
-    from app.models.event import Event
-    from datetime import datetime, timedelta
-
     # Parse dates
     start = parse_date(start_date)
     end = parse_date(end_date)
@@ -400,18 +466,14 @@ def get_free_time_slots(
         Event.date <= end
     ).order_by(Event.date, Event.time).all()
 
-    # Build a dict of occupied time slots
-    occupied = {}
+    # Index occupied start times per date for O(1) slot lookups
+    occupied: Dict[str, set] = {}
     for event in existing_events:
         date_key = event.date.isoformat()
-        if date_key not in occupied:
-            occupied[date_key] = []
+        times = occupied.setdefault(date_key, set())
 
         if event.time:
-            occupied[date_key].append({
-                "time": event.time,
-                "duration": 60  # Default 1 hour if not specified
-            })
+            times.add(event.time)
 
     # Generate free slots
     free_slots = []
@@ -423,8 +485,7 @@ def get_free_time_slots(
 
         # Check if this day is preferred
         if time_preferences and "preferred_days" in time_preferences:
-            day_names = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-            if day_names[weekday] not in time_preferences["preferred_days"]:
+            if WEEKDAY_KEYS[weekday] not in time_preferences["preferred_days"]:
                 current_date += timedelta(days=1)
                 continue
 
@@ -445,18 +506,8 @@ def get_free_time_slots(
         # Check each time slot
         for time_str in time_slots:
             # Check if this slot is occupied
-            is_free = True
-            if date_key in occupied:
-                from datetime import time as time_type
-                from dateutil import parser as dtparser
-                slot_time = dtparser.parse(time_str).time()
-
-                for occ in occupied[date_key]:
-                    if occ["time"] == slot_time:
-                        is_free = False
-                        break
-
-            if is_free:
+            occupied_times = occupied.get(date_key)
+            if not occupied_times or _slot_time(time_str) not in occupied_times:
                 duration = time_preferences.get("duration_minutes", 120) if time_preferences else 120
                 free_slots.append({
                     "date": date_key,
@@ -495,8 +546,6 @@ def check_scheduling_feasibility(
             "suggested_deadline": "2025-12-15"  # If not feasible
         }
     """
-    from datetime import datetime, timedelta
-
     # Get goal and steps
     goal = session.query(Goal).filter(
         Goal.id == goal_id,
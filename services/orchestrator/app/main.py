@@ -1,7 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 import os
 
@@ -36,6 +36,14 @@ CORE_SERVICE_URL = os.getenv("CORE_SERVICE_URL", "http://core:8004")
 # HTTP client (synchronous)
 http_client = httpx.Client(timeout=30.0)
 
+# Day picker for scheduling: callback key -> button label, in display order
+DAY_PREF_LABELS = {"mon": "Пн", "tue": "Вт", "wed": "Ср", "thu": "Чт", "fri": "Пт", "sat": "Сб", "sun": "Вс"}
+
+# Table item kind per intent domain, so the gateway can pick a renderer directly
+ITEM_KINDS = {"event": "event", "goal": "goal", "product": "product"}
+# Intent actions that only read data; their tables may be briefly reused by the gateway
+READ_ACTIONS = {"search", "query"}
+
 
 @app.on_event("startup")
 async def startup():
@@ -96,6 +104,8 @@ class ProcessMessageResponse(BaseModel):
     items: Optional[list] = None
     set_id: Optional[str] = None
     buttons: Optional[list] = None  # For inline buttons: [{"text": "...", "callback_data": "..."}]
+    item_kind: Optional[str] = None  # For tables: 'event' | 'goal' | 'product' | 'cart'
+    cacheable: bool = False  # Table came from a read-only intent
     error: Optional[str] = None
 
 
@@ -204,6 +214,13 @@ def _calculate_similarity(s1: str, s2: str) -> float:
     return len(intersection) / len(union) if union else 0.0
 
 
+def _item_kind(intent: str) -> Optional[str]:
+    """Kind of table items an intent produces, if it is a known domain"""
+    if intent == "product.add_to_cart":
+        return "cart"
+    return ITEM_KINDS.get(intent.partition(".")[0])
+
+
 async def execute_intent(intent: str, params: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     """Execute intent via Core Service"""
 
@@ -732,6 +749,38 @@ async def update_session_state(user_id: str, state: str, context: Dict[str, Any]
         logger.error(f"Failed to update session state: {e}")
 
 
+async def toggle_session_list_value(
+    user_id: str,
+    key: str,
+    value: str,
+    state: str,
+    session_context: Dict[str, Any]
+) -> List[str]:
+    """Atomically toggle a value in a session context list via Context Service"""
+    try:
+        response = http_client.patch(
+            f"{CONTEXT_SERVICE_URL}/api/session/{user_id}/context/{key}/toggle",
+            json={
+                "value": value,
+                "current_state": state,
+                "expiry_hours": StateMachine.get_context_expiry(state)
+            }
+        )
+        if response.status_code == 200:
+            return response.json().get("context", {}).get(key, [])
+        logger.error(f"Failed to toggle session {key}: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Failed to toggle session {key}: {e}")
+
+    # Fall back to the locally known selection so the keyboard still renders
+    values = list(session_context.get(key, []))
+    if value in values:
+        values.remove(value)
+    else:
+        values.append(value)
+    return values
+
+
 # ==================== MAIN ENDPOINT ====================
 
 async def handle_scheduling_flow(user_id: str, message: str, current_state: str, session_context: Dict[str, Any]) -> Optional[ProcessMessageResponse]:
@@ -1313,7 +1362,9 @@ async def process_message(request: ProcessMessageRequest):
                 response_type="table",
                 text=summary.get("text"),
                 items=summary.get("items"),
-                set_id=summary.get("set_id")
+                set_id=summary.get("set_id"),
+                item_kind=_item_kind(intent),
+                cacheable=intent.partition(".")[2] in READ_ACTIONS
             )
         elif response_type == "ask_clarification":
             return ProcessMessageResponse(
@@ -1407,18 +1458,10 @@ async def process_callback(request: ProcessCallbackRequest):
             time_slot = parts[1]  # morning, afternoon, evening
             goal_id = int(parts[2])
 
-            # Get current preferences
-            preferred_times = session_context.get("preferred_times", [])
-            if time_slot in preferred_times:
-                preferred_times.remove(time_slot)
-            else:
-                preferred_times.append(time_slot)
-
-            new_context = {
-                **session_context,
-                "preferred_times": preferred_times
-            }
-            await update_session_state(user_id, DialogState.GOAL_SCHEDULE_TIME_PREF, new_context)
+            preferred_times = await toggle_session_list_value(
+                user_id, "preferred_times", time_slot,
+                DialogState.GOAL_SCHEDULE_TIME_PREF, session_context
+            )
 
             # Show updated selection
             time_names = {
@@ -1460,15 +1503,10 @@ async def process_callback(request: ProcessCallbackRequest):
 
             text = "📅 <b>В какие дни недели тебе удобно?</b>\n(можно выбрать несколько)"
             buttons = [
-                {"text": "Пн", "callback_data": f"day_pref:mon:{goal_id}"},
-                {"text": "Вт", "callback_data": f"day_pref:tue:{goal_id}"},
-                {"text": "Ср", "callback_data": f"day_pref:wed:{goal_id}"},
-                {"text": "Чт", "callback_data": f"day_pref:thu:{goal_id}"},
-                {"text": "Пт", "callback_data": f"day_pref:fri:{goal_id}"},
-                {"text": "Сб", "callback_data": f"day_pref:sat:{goal_id}"},
-                {"text": "Вс", "callback_data": f"day_pref:sun:{goal_id}"},
-                {"text": "✅ Готово", "callback_data": f"day_pref_done:{goal_id}"}
+                {"text": label, "callback_data": f"day_pref:{d}:{goal_id}"}
+                for d, label in DAY_PREF_LABELS.items()
             ]
+            buttons.append({"text": "✅ Готово", "callback_data": f"day_pref_done:{goal_id}"})
 
             return ProcessMessageResponse(
                 success=True,
@@ -1482,27 +1520,19 @@ async def process_callback(request: ProcessCallbackRequest):
             day = parts[1]
             goal_id = int(parts[2])
 
-            # Get current preferences
-            preferred_days = session_context.get("preferred_days", [])
-            if day in preferred_days:
-                preferred_days.remove(day)
-            else:
-                preferred_days.append(day)
-
-            new_context = {
-                **session_context,
-                "preferred_days": preferred_days
-            }
-            await update_session_state(user_id, DialogState.GOAL_SCHEDULE_DAYS_PREF, new_context)
+            preferred_days = await toggle_session_list_value(
+                user_id, "preferred_days", day,
+                DialogState.GOAL_SCHEDULE_DAYS_PREF, session_context
+            )
 
             # Show updated selection
             selected = ", ".join(preferred_days) if preferred_days else "не выбрано"
             text = f"📅 <b>В какие дни недели тебе удобно?</b>\n(можно выбрать несколько)\n\nВыбрано: {selected}"
 
+            selected_days = set(preferred_days)
             day_buttons = []
-            for d in ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]:
-                label = {"mon": "Пн", "tue": "Вт", "wed": "Ср", "thu": "Чт", "fri": "Пт", "sat": "Сб", "sun": "Вс"}[d]
-                if d in preferred_days:
+            for d, label in DAY_PREF_LABELS.items():
+                if d in selected_days:
                     label = f"✅ {label}"
                 day_buttons.append({"text": label, "callback_data": f"day_pref:{d}:{goal_id}"})
 
@@ -1704,3 +1734,26 @@ async def process_callback(request: ProcessCallbackRequest):
             text="Упс, произошла ошибка. Попробуй ещё раз.",
             error=str(e)
         )
+
+
+class ProcessCallbackBatchRequest(BaseModel):
+    user_id: str
+    callbacks: List[str]
+
+
+class ProcessCallbackBatchResponse(BaseModel):
+    results: List[ProcessMessageResponse]
+
+
+@app.post("/api/callbacks", response_model=ProcessCallbackBatchResponse)
+async def process_callbacks(request: ProcessCallbackBatchRequest):
+    """
+    Handle a burst of callbacks from one user in a single request.
+    Callbacks are applied strictly in order; one result per callback.
+    """
+    results = []
+    for callback_data in request.callbacks:
+        results.append(await process_callback(
+            ProcessCallbackRequest(user_id=request.user_id, callback_data=callback_data)
+        ))
+    return ProcessCallbackBatchResponse(results=results)
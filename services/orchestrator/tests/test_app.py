@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import ProcessMessageResponse
+
+
+USER_ID = "test_callbacks_user"
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    calls = []
+
+    async def fake_process_callback(request):
+        calls.append((request.user_id, request.callback_data))
+        return ProcessMessageResponse(
+            success=True,
+            response_type="text",
+            text=f"handled {request.callback_data}",
+        )
+
+    monkeypatch.setattr(main, "process_callback", fake_process_callback)
+    return calls
+
+
+def test_process_callbacks_applies_callbacks_in_order(client: TestClient, handled: list):
+    callbacks = ["day_pref:mon", "day_pref:wed", "day_pref:done"]
+
+    response = client.post(
+        "/api/callbacks",
+        json={"user_id": USER_ID, "callbacks": callbacks},
+    )
+
+    assert response.status_code == 200
+    assert handled == [(USER_ID, payload) for payload in callbacks]
+    results = response.json()["results"]
+    assert [result["text"] for result in results] == [f"handled {payload}" for payload in callbacks]
+
+
+def test_process_callbacks_empty_batch(client: TestClient, handled: list):
+    response = client.post(
+        "/api/callbacks",
+        json={"user_id": USER_ID, "callbacks": []},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"results": []}
+    assert handled == []